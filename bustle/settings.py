@@ -173,6 +173,34 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 SESSION_COOKIE_AGE = 86400 #30 дней
 SESSION_SAVE_EVERY_REQUEST = True
 
+# Где хранить корзины анонимных посетителей: 'db' (Cart по ключу сессии)
+# или 'cookie' (подписанная cookie, строка Cart появляется при входе)
+CART_STORAGE = os.getenv('CART_STORAGE', 'db')
+CART_COOKIE_NAME = 'cart'
+
+# Общий для всех процессов кеш, поэтому локальный LocMemCache здесь не подходит.
+# В 'default' лежат только версия снимка меню (main.menu) и версии тегов
+# фрагментов: записей немного, и чистка переполненного кеша их не задевает.
+# Фрагменты и подсказки (ключи от произвольных запросов) — в отдельном 'fragments'.
+# Папка CACHE_LOCATION должна быть одна на все процессы, которые меняют меню:
+# gunicorn, воркер фото и cron-команды. Иначе сброс версии в одном контейнере
+# не увидят остальные, и они будут отдавать старое меню. В docker-compose.yml
+# для этого во все сервисы подключён том cache.
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_LOCATION, 'menu'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_LOCATION, 'fragments'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
 AUTH_USER_MODEL = 'users.CustomUser'    
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField' 
 LOGIN_URL = 'users:login'
\ No newline at end of file
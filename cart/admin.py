@@ -14,6 +14,10 @@ class CartAdmin(admin.ModelAdmin):
     inlines = [CartItemInline]
     readonly_fields = ('total_items', 'subtotal')
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.recalculate_totals()
+
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
@@ -21,4 +25,18 @@ class CartItemAdmin(admin.ModelAdmin):
                     'quantity', 'total_price', 'added_at')
     list_filter = ('added_at',)
     search_fields = ('dish__name', 'cart__session_key')
-    readonly_fields = ('total_price',)
\ No newline at end of file
+    readonly_fields = ('total_price',)
+    # Правка позиции мимо методов корзины: итоги затронутых корзин пересчитываются
+    def save_model(self, request, obj, form, change):
+        previous_cart_id = form.initial.get('cart') if change else None
+        super().save_model(request, obj, form, change)
+        Cart.objects.filter(pk__in={obj.cart_id, previous_cart_id} - {None}).recalculate_totals()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        Cart.objects.filter(pk=obj.cart_id).recalculate_totals()
+
+    def delete_queryset(self, request, queryset):
+        cart_ids = set(queryset.values_list('cart_id', flat=True))
+        super().delete_queryset(request, queryset)
+        Cart.objects.filter(pk__in=cart_ids).recalculate_totals()
@@ -1,13 +1,8 @@
-from .models import Cart
+from .middleware import get_cart
 
 
 def cart_processor(request):
-    if not request.session.session_key:
-        request.session.create()
-
-    cart, created = Cart.objects. get_or_create(
-        session_key = request.session.session_key
-    )
+    cart = get_cart(request)
 
     return {
         'cart_total_items': cart.total_items,
@@ -0,0 +1,131 @@
+from decimal import Decimal
+
+from django.conf import settings
+
+from main.models import Dish
+from .models import CartItem
+
+
+COOKIE_SALT = 'cart.cookie'
+MAX_LINES = 50
+
+
+def uses_cookie_storage(request):
+    """Анонимные корзины живут в cookie, если так настроено CART_STORAGE."""
+    user = getattr(request, 'user', None)
+    return (
+        getattr(settings, 'CART_STORAGE', 'db') == 'cookie'
+        and not (user is not None and user.is_authenticated)
+    )
+
+
+class CookieCart:
+    """
+    Корзина анонимного посетителя в подписанной cookie вида "dish_id-qty.dish_id-qty".
+    Повторяет API модели Cart, но ничего не пишет в базу; id позиции — id блюда.
+    """
+    pk = id = None
+
+    def __init__(self, lines=None):
+        # [(dish_id, quantity)], новые позиции в начале — как order_by('-added_at')
+        self.lines = list(lines or [])
+        self.modified = False
+        self._dishes = None
+
+    @classmethod
+    def from_request(cls, request):
+        value = request.get_signed_cookie(
+            settings.CART_COOKIE_NAME, default='', salt=COOKIE_SALT,
+            max_age=settings.SESSION_COOKIE_AGE,
+        )
+        return cls(cls.decode(value))
+
+    @staticmethod
+    def decode(value):
+        lines = []
+        for chunk in value.split('.'):
+            dish_id, _, quantity = chunk.partition('-')
+            if dish_id.isdigit() and quantity.isdigit() and int(quantity) > 0:
+                lines.append((int(dish_id), int(quantity)))
+        return lines[:MAX_LINES]
+
+    def encode(self):
+        return '.'.join(f'{dish_id}-{quantity}' for dish_id, quantity in self.lines)
+
+    def save_to(self, response):
+        if not self.lines:
+            response.delete_cookie(settings.CART_COOKIE_NAME)
+            return
+        response.set_signed_cookie(
+            settings.CART_COOKIE_NAME, self.encode(), salt=COOKIE_SALT,
+            max_age=settings.SESSION_COOKIE_AGE,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite='Lax',
+        )
+
+    def _get_dishes(self):
+        """Блюда корзины одним запросом; позиции удалённых блюд выбрасываются."""
+        if self._dishes is None:
+            self._dishes = Dish.objects.in_bulk([dish_id for dish_id, _ in self.lines])
+            lines = [line for line in self.lines if line[0] in self._dishes]
+            if len(lines) != len(self.lines):
+                self.lines = lines
+                self.modified = True
+        return self._dishes
+
+    def _set_lines(self, lines):
+        self.lines = lines[:MAX_LINES]
+        self.modified = True
+
+    def get_items(self):
+        dishes = self._get_dishes()
+        return [
+            CartItem(id=dish_id, dish=dishes[dish_id], quantity=quantity)
+            for dish_id, quantity in self.lines
+        ]
+
+    def get_lines(self, item_ids):
+        item_ids = set(item_ids)
+        return [item for item in self.get_items() if item.id in item_ids]
+
+    @property
+    def total_items(self):
+        return sum(quantity for _, quantity in self.lines)
+
+    @property
+    def subtotal(self):
+        return sum((item.total_price for item in self.get_items()), Decimal('0.00'))
+
+    def recalculate_totals(self):
+        pass
+
+    def add_dish(self, dish, quantity=1):
+        current = dict(self.lines).get(dish.pk, 0)
+        lines = [line for line in self.lines if line[0] != dish.pk]
+        self._set_lines([(dish.pk, current + quantity)] + lines)
+        if self._dishes is not None:
+            self._dishes[dish.pk] = dish
+        return CartItem(id=dish.pk, dish=dish, quantity=current + quantity)
+
+    def remove_item(self, item_id):
+        return self.update_item_quantity(item_id, 0)
+
+    def update_item_quantity(self, item_id, quantity):
+        return self.apply_changes({item_id: quantity}) > 0
+
+    def apply_changes(self, changes):
+        changed = 0
+        lines = []
+        for dish_id, quantity in self.lines:
+            if dish_id in changes:
+                changed += 1
+                quantity = changes[dish_id]
+            if quantity > 0:
+                lines.append((dish_id, quantity))
+        if changed:
+            self._set_lines(lines)
+        return changed
+
+    def clear(self):
+        self._set_lines([])
@@ -0,0 +1,86 @@
+"""
+Команда для удаления корзин с истёкшими сессиями и самих истёкших сессий.
+Использование: python manage.py cleanup_carts [--keep-days N] [--batch-size N] [--interval SECONDS]
+"""
+import time
+from datetime import timedelta
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = 'Удаляет корзины, чья сессия истекла, и истёкшие сессии небольшими пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=0,
+            help='Не трогать корзины моложе N дней, даже если их сессия истекла',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько корзин или сессий удалять в одной транзакции',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Периодический режим: повторять очистку каждые N секунд',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        interval = options['interval']
+
+        while True:
+            carts, items, sessions = self.cleanup(options['keep_days'], batch_size)
+            self.stdout.write(self.style.SUCCESS(
+                f'Удалено корзин: {carts}, позиций: {items}, сессий: {sessions}'
+            ))
+            if interval <= 0:
+                break
+            try:
+                time.sleep(interval)
+            except KeyboardInterrupt:
+                break
+
+    def cleanup(self, keep_days, batch_size):
+        now = timezone.now()
+        live_session = Session.objects.filter(
+            session_key=OuterRef('session_key'),
+            expire_date__gt=now,
+        )
+        stale_carts = Cart.objects.filter(~Exists(live_session))
+        if keep_days > 0:
+            stale_carts = stale_carts.filter(created_at__lt=now - timedelta(days=keep_days))
+
+        carts = items = 0
+        for ids in self.batches(stale_carts, batch_size):
+            with transaction.atomic():
+                _, deleted = Cart.objects.filter(pk__in=ids).delete()
+            carts += deleted.get(Cart._meta.label, 0)
+            items += deleted.get(CartItem._meta.label, 0)
+
+        sessions = 0
+        expired_sessions = Session.objects.filter(expire_date__lte=now)
+        for keys in self.batches(expired_sessions, batch_size):
+            with transaction.atomic():
+                sessions += Session.objects.filter(pk__in=keys).delete()[0]
+
+        return carts, items, sessions
+
+    def batches(self, queryset, batch_size):
+        while True:
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return
+            yield ids
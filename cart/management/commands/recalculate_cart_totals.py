@@ -0,0 +1,34 @@
+"""
+Команда для пересчёта денормализованных итогов корзин (total_items, subtotal).
+Использование: python manage.py recalculate_cart_totals [--batch-size N]
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from cart.models import Cart
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает количество позиций и сумму всех корзин по их содержимому'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Сколько корзин пересчитывать одним UPDATE (по диапазону id)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        max_id = Cart.objects.aggregate(max_id=Max('pk'))['max_id'] or 0
+
+        updated = 0
+        for start in range(0, max_id, batch_size):
+            with transaction.atomic():
+                updated += Cart.objects.filter(
+                    pk__gt=start, pk__lte=start + batch_size,
+                ).recalculate_totals()
+
+        self.stdout.write(self.style.SUCCESS(f'Готово. Пересчитано корзин: {updated}'))
@@ -1,13 +1,34 @@
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+from django.conf import settings
+from .cookie import CookieCart, uses_cookie_storage
 from .models import Cart
 
 
+def get_cart(request, create=False):
+    """
+    Корзина текущего запроса: загружается не более одного раза.
+    Сессия и строка корзины создаются только при create=True.
+    """
+    cart = getattr(request, '_cached_cart', None)
+    if cart is None or (create and cart.pk is None):
+        if uses_cookie_storage(request):
+            cart = cart or CookieCart.from_request(request)
+        else:
+            cart = Cart.objects.for_request(request, create=create)
+        request._cached_cart = cart
+    return cart
+
+
 class CartMiddleware(MiddlewareMixin):
     def process_request(self, request):
-        if not request.session.session_key:
-            request.session.create()
+        request.cart = SimpleLazyObject(lambda: get_cart(request))
+        return None
 
-        request.cart, created = Cart.objects.get_or_create(
-            session_key = request.session.session_key
-        )
-        return None
\ No newline at end of file
+    def process_response(self, request, response):
+        cart = getattr(request, '_cached_cart', None)
+        if isinstance(cart, CookieCart) and cart.modified:
+            cart.save_to(response)
+        elif getattr(request, '_cart_cookie_persisted', False):
+            response.delete_cookie(settings.CART_COOKIE_NAME)
+        return response
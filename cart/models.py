@@ -1,67 +1,261 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.utils import timezone
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.sessions.models import Session
 from main.models import Dish
 from decimal import Decimal
 
 
+class CartQuerySet(models.QuerySet):
+    def recalculate_totals(self):
+        """Пересчитать total_items и subtotal одним UPDATE по позициям корзин."""
+        lines = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+        items_count = lines.annotate(total=Sum('quantity')).values('total')
+        amount = lines.annotate(
+            total=Sum(
+                F('quantity') * F('dish__price'),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )
+        ).values('total')
+        return self.update(
+            total_items=Coalesce(Subquery(items_count), 0),
+            subtotal=Coalesce(Subquery(amount), Decimal('0.00'),
+                              output_field=DecimalField(max_digits=10, decimal_places=2)),
+        )
+
+
+class CartManager(models.Manager.from_queryset(CartQuerySet)):
+    def for_request(self, request, create=False):
+        """
+        Корзина сессии запроса. Без create=True сессия и строка корзины
+        не создаются: посетителю без корзины отдаётся пустая несохранённая.
+        """
+        session_key = request.session.session_key
+        if session_key:
+            cart = self.filter(session_key=session_key).first()
+            if cart is not None:
+                return cart
+
+        if not create:
+            return self.model(session_key=session_key or '')
+
+        if not session_key:
+            request.session.create()
+
+        cart, created = self.get_or_create(
+            session_key = request.session.session_key
+        )
+        return cart
+
+
 class Cart(models.Model):
     session_key = models.CharField(max_length=40, unique=True)
+    total_items = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartManager()
+
 
     def __str__(self):
         return f"Cart {self.session_key}"
     
 
-    @property
-    def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+    def get_items(self):
+        """Позиции корзины вместе с блюдами; загружаются один раз на экземпляр."""
+        if self.pk is None:
+            return []
+        if not hasattr(self, '_items_cache'):
+            self._items_cache = list(
+                self.items.select_related('dish').order_by('-added_at')
+            )
+        return self._items_cache
     
+
+    def get_lines(self, item_ids):
+        """Только указанные позиции — для ответов, которые перерисовывают изменённые строки."""
+        if self.pk is None or not item_ids:
+            return []
+        return list(self.items.select_related('dish').filter(id__in=item_ids))
     
-    @property
-    def subtotal(self):
-        return sum(item.total_price for item in self.items.all())
+
+    def _reset_items_cache(self):
+        self.__dict__.pop('_items_cache', None)
+    
+
+    def _bump_totals(self, items_delta, amount_delta):
+        Cart.objects.filter(pk=self.pk).update(
+            total_items=F('total_items') + items_delta,
+            subtotal=F('subtotal') + amount_delta,
+            updated_at=timezone.now(),
+        )
+        self.refresh_from_db(fields=['total_items', 'subtotal', 'updated_at'])
+        self._reset_items_cache()
+    
+
+    def recalculate_totals(self):
+        Cart.objects.filter(pk=self.pk).recalculate_totals()
+        self.refresh_from_db(fields=['total_items', 'subtotal'])
     
 
     def add_dish(self, dish, quantity=1):
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=self,
-            dish=dish,
-            defaults={'quantity': quantity}
+        """
+        Добавить блюдо через INSERT ... ON CONFLICT DO UPDATE: параллельные
+        клики не теряют инкремент и не упираются в unique_together.
+        На PostgreSQL позиция и итоги корзины обновляются одним запросом.
+        """
+        item_table = connection.ops.quote_name(CartItem._meta.db_table)
+        cart_table = connection.ops.quote_name(Cart._meta.db_table)
+        now = timezone.now()
+        amount = dish.price * quantity
+        upsert = (
+            f'INSERT INTO {item_table} (cart_id, dish_id, quantity, added_at) '
+            f'VALUES (%s, %s, %s, %s) '
+            f'ON CONFLICT (cart_id, dish_id) '
+            f'DO UPDATE SET quantity = {item_table}.quantity + EXCLUDED.quantity '
+            f'RETURNING id, quantity'
         )
+        bump = (
+            f'UPDATE {cart_table} '
+            f'SET total_items = total_items + %s, subtotal = subtotal + %s, updated_at = %s '
+            f'WHERE id = %s RETURNING total_items, subtotal'
+        )
+        upsert_params = [self.pk, dish.pk, quantity, connection.ops.adapt_datetimefield_value(now)]
+        bump_params = [quantity, connection.ops.adapt_decimalfield_value(amount),
+                       connection.ops.adapt_datetimefield_value(now), self.pk]
 
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'WITH line AS ({upsert}), totals AS ({bump}) '
+                    f'SELECT line.id, line.quantity, totals.total_items, totals.subtotal '
+                    f'FROM line, totals',
+                    upsert_params + bump_params,
+                )
+                item_id, item_quantity, total_items, subtotal = cursor.fetchone()
+            else:
+                cursor.execute(upsert, upsert_params)
+                item_id, item_quantity = cursor.fetchone()
+                cursor.execute(bump, bump_params)
+                total_items, subtotal = cursor.fetchone()
 
-        return cart_item
+        self.total_items = total_items
+        self.subtotal = self._meta.get_field('subtotal').to_python(subtotal)
+        self.updated_at = now
+        self._reset_items_cache()
+        return CartItem(id=item_id, cart=self, dish=dish, quantity=item_quantity)
+    
+
+    def lock_for_checkout(self):
+        """
+        Заблокировать позиции и строку корзины до конца транзакции и один раз
+        прочитать позиции с блюдами. Порядок блокировок тот же, что в remove_item
+        и apply_changes (сначала позиции, потом корзина), чтобы оформление
+        заказа не ловило взаимоблокировку с параллельной правкой корзины.
+        """
+        if self.pk is None:
+            return []
+        items = list(
+            self.items.select_for_update(of=('self',)).select_related('dish').order_by('pk')
+        )
+        list(Cart.objects.select_for_update().filter(pk=self.pk).values_list('pk', flat=True))
+        return items
+    
+
+    def _get_item_for_update(self, item_id):
+        return self.items.select_for_update(of=('self',)).select_related('dish').get(id=item_id)
     
 
     def remove_item(self, item_id):
+        if self.pk is None:
+            return False
         try:
-            item = self.items.get(id=item_id)
-            item.delete()
+            with transaction.atomic():
+                item = self._get_item_for_update(item_id)
+                item.delete()
+                self._bump_totals(-item.quantity, -item.total_price)
             return True
         except CartItem.DoesNotExist:
             return False
         
     
     def update_item_quantity(self, item_id, quantity):
+        if self.pk is None:
+            return False
         try:
-            item = self.items.get(id=item_id)
-            if quantity > 0:
-                item.quantity = quantity
-                item.save()
-            else:
-                item.delete()
+            with transaction.atomic():
+                item = self._get_item_for_update(item_id)
+                delta = max(quantity, 0) - item.quantity
+                if quantity > 0:
+                    item.quantity = quantity
+                    item.save()
+                else:
+                    item.delete()
+                self._bump_totals(delta, item.dish.price * delta)
             return True
         except CartItem.DoesNotExist:
             return False
         
     
+    def apply_changes(self, changes):
+        """
+        Применить пачку изменений {item_id: quantity} в одной транзакции:
+        bulk_update для новых количеств, одно удаление для нулевых.
+        Возвращает число изменённых позиций; чужие id игнорируются.
+        """
+        return self._change_quantities(changes, lambda item, quantity: quantity)
+
+    def remove_ordered(self, ordered):
+        """
+        Вычесть оформленные в заказ количества {item_id: quantity}. Если позицию
+        успели увеличить после оформления, в корзине остаётся разница.
+        """
+        return self._change_quantities(ordered, lambda item, quantity: item.quantity - quantity)
+
+    def _change_quantities(self, changes, new_quantity):
+        if self.pk is None or not changes:
+            return 0
+
+        with transaction.atomic():
+            items = list(
+                self.items.select_for_update(of=('self',)).select_related('dish')
+                .filter(id__in=changes.keys()).order_by('pk')
+            )
+            to_update, to_delete = [], []
+            items_delta, amount_delta = 0, Decimal('0.00')
+            for item in items:
+                quantity = max(new_quantity(item, changes[item.id]), 0)
+                delta = quantity - item.quantity
+                if quantity > 0:
+                    item.quantity = quantity
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.id)
+                items_delta += delta
+                amount_delta += item.dish.price * delta
+
+            if to_update:
+                CartItem.objects.bulk_update(to_update, ['quantity'])
+            if to_delete:
+                self.items.filter(id__in=to_delete).delete()
+            if items:
+                self._bump_totals(items_delta, amount_delta)
+        return len(items)
+    
+
     def clear(self):
-        self.items.all().delete()
+        if self.pk is None:
+            return
+        with transaction.atomic():
+            self.items.all().delete()
+            Cart.objects.filter(pk=self.pk).update(
+                total_items=0, subtotal=Decimal('0.00'), updated_at=timezone.now(),
+            )
+        self.total_items = 0
+        self.subtotal = Decimal('0.00')
+        self._reset_items_cache()
 
 
 class CartItem(models.Model):
@@ -81,4 +275,4 @@ class CartItem(models.Model):
 
     @property
     def total_price(self):
-        return Decimal(str(self.dish.price)) * self.quantity
\ No newline at end of file
+        return Decimal(str(self.dish.price)) * self.quantity
@@ -0,0 +1,53 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from main.models import Dish
+from .cookie import CookieCart
+from .models import Cart
+
+
+@receiver(post_save, sender=Dish)
+def recalculate_carts_on_dish_change(sender, instance, created, **kwargs):
+    """Цена блюда могла измениться — пересчитываем корзины, где оно лежит."""
+    if created:
+        return
+    Cart.objects.filter(items__dish=instance).recalculate_totals()
+
+
+@receiver(pre_delete, sender=Dish)
+def remember_carts_with_dish(sender, instance, **kwargs):
+    instance._cart_ids = list(
+        Cart.objects.filter(items__dish=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Dish)
+def recalculate_carts_on_dish_delete(sender, instance, **kwargs):
+    cart_ids = getattr(instance, '_cart_ids', None)
+    if cart_ids:
+        Cart.objects.filter(pk__in=cart_ids).recalculate_totals()
+
+
+@receiver(user_logged_in)
+def persist_cart_on_login(sender, request, user, **kwargs):
+    """
+    При входе ключ сессии меняется: переносим на него корзину из базы,
+    а cookie-корзину анонимного посетителя впервые записываем в Cart.
+    """
+    if request is None:
+        return
+    session_key = request.session.session_key
+    cart_id = request.session.get('cart_id')
+    if cart_id and not Cart.objects.filter(session_key=session_key).exists():
+        Cart.objects.filter(pk=cart_id).update(session_key=session_key)
+
+    request.__dict__.pop('_cached_cart', None)
+    cookie_cart = CookieCart.from_request(request)
+    if not cookie_cart.lines:
+        return
+    cart = Cart.objects.for_request(request, create=True)
+    for item in cookie_cart.get_items():
+        cart.add_dish(item.dish, item.quantity)
+    request.session['cart_id'] = cart.id
+    request._cached_cart = cart
+    request._cart_cookie_persisted = True
@@ -1,46 +1,50 @@
-from django.shortcuts import redirect, get_object_or_404
+from django.shortcuts import get_object_or_404
 from django.views.generic import View
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, Http404
 from django.template.response import TemplateResponse
 from django.contrib import messages
 from django.db import transaction
 from main.models import Dish
-from .models import Cart, CartItem
 from .forms import AddToCartForm
+from .middleware import get_cart
 import json
 
 
 class CartMixin:
-    def get_cart(self, request):
-        if hasattr(request, 'cart'):
-            return request.cart
-        if not request.session.session_key:
-            request.session.create()
+    def get_cart(self, request, create=False):
+        return get_cart(request, create=create)
 
+    def remember_cart(self, request, cart):
+        # Cookie-корзина не должна создавать сессию
+        if cart.pk is not None:
+            request.session['cart_id'] = cart.id
 
-        cart, created = Cart.objects.get_or_create(
-            session_key = request.session_key
-        )
-
-        request.session['cart_id'] = cart.id
-        request.session.modified = True
-        return cart
+    def render_changes(self, request, cart, item_ids=(), added_item=None):
+        """
+        Ответ на изменение корзины: только затронутые строки, итоги и счётчик
+        в шапке как hx-swap-oob фрагменты, без перерисовки всей модалки.
+        """
+        changed_items = cart.get_lines(item_ids)
+        present_ids = {item.id for item in changed_items}
+        return TemplateResponse(request, 'cart/cart_changes.html', {
+            'cart': cart,
+            'added_item': added_item,
+            'changed_items': changed_items,
+            'removed_ids': [item_id for item_id in item_ids if item_id not in present_ids],
+        })
 
 class CartModalView(CartMixin, View):
     def get(self, request):
         cart = self.get_cart(request)
         context = {
             'cart': cart,
-            'cart_items': cart.items.select_related(
-                'dish',
-            ).order_by('-added_at')
+            'cart_items': cart.get_items()
         }
         return TemplateResponse(request, 'cart/cart_modal.html', context)
 
 class AddToCartView(CartMixin, View):
     @transaction.atomic
     def post(self, request, slug):
-        cart = self.get_cart(request)
         dish = get_object_or_404(Dish, slug=slug)
 
         form = AddToCartForm(request.POST, dish=dish)
@@ -48,81 +52,89 @@ class AddToCartView(CartMixin, View):
         if not form.is_valid():
             return JsonResponse({
                 'error': 'Invalid form data',
-                'errors': form.error
+                'errors': form.errors
             }, status=400)
         
+        cart = self.get_cart(request, create=True)
         quantity = form.cleaned_data['quantity']
-        existing_item = cart.items.filter(
-            dish=dish,
-        ).first()
-
-        if existing_item:
-            total_quantity = existing_item.quantity + quantity
-        
         cart_item = cart.add_dish(dish, quantity)
 
-        request.session['cart_id'] = cart.id
-        request.session.modified = True
+        self.remember_cart(request, cart)
 
+        message = f"{dish.name} добавлено в корзину"
         if request.headers.get('HX-Request'):
-            return redirect('cart:cart_modal')
+            if cart_item.quantity == quantity:
+                response = self.render_changes(request, cart, added_item=cart_item)
+            else:
+                response = self.render_changes(request, cart, item_ids=[cart_item.id])
+            response['HX-Trigger'] = json.dumps({
+                'cartUpdated': {'total_items': cart.total_items, 'message': message},
+            })
+            return response
         else:
             return JsonResponse({
                 'success': True,
                 'total_items': cart.total_items,
-                'message': f"{dish.name} добавлено в корзину",
+                'message': message,
                 'cart_item_id': cart_item.id,
             })
 class UpdateCartItemView(CartMixin, View):
     @transaction.atomic
     def post(self, request, item_id):
         cart = self.get_cart(request)
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
 
         quantity = int(request.POST.get('quantity', 1))
 
         if quantity < 0:
             return JsonResponse({'error': 'Invalid quantity'}, status=400)
         
-        if quantity == 0:
-            cart_item.delete()
+        if not cart.update_item_quantity(item_id, quantity):
+            raise Http404('Cart item not found')
+
+        self.remember_cart(request, cart)
+
+        return self.render_changes(request, cart, item_ids=[item_id])
+    
 
+class BatchUpdateCartView(CartMixin, View):
+    """Изменения [{"item_id": ..., "quantity": ...}] из JSON-тела или поля changes."""
+    def parse_changes(self, request):
+        if request.content_type == 'application/json':
+            payload = request.body
         else:
-            cart_item.quantity = quantity
-            cart_item.save()
+            payload = request.POST.get('changes', '')
+        try:
+            data = json.loads(payload or '[]')
+            if isinstance(data, dict):
+                data = data.get('changes', [])
+            changes = {int(row['item_id']): int(row['quantity']) for row in data}
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return None
+        if any(quantity < 0 for quantity in changes.values()):
+            return None
+        return changes
 
-        request.session['cart_id'] = cart.id
-        request.session.modified = True
+    def post(self, request):
+        cart = self.get_cart(request)
+        changes = self.parse_changes(request)
+        if changes is None:
+            return JsonResponse({'error': 'Invalid changes'}, status=400)
 
-        context = {
-            'cart': cart,
-            'cart_items': cart.items.select_related(
-                'dish',
-            ).order_by('-added_at')
-        }
-        return TemplateResponse(request, 'cart/cart_modal.html', context)
+        if cart.apply_changes(changes):
+            self.remember_cart(request, cart)
+
+        return self.render_changes(request, cart, item_ids=list(changes))
     
 
 class RemoveCartItemView(CartMixin, View):
     def post(self, request, item_id):
         cart = self.get_cart(request)
 
-        try:
-            cart_item = cart.items.get(id=item_id)
-            cart_item.delete()
+        if cart.remove_item(item_id):
+            self.remember_cart(request, cart)
 
-            request.session['cart_id'] = cart.id
-            request.session.modified = True
-
-            context = {
-                'cart': cart,
-                'cart_items': cart.items.select_related(
-                    'dish',
-                ).order_by('-added_at')
-            }
-            return TemplateResponse(request, 'cart/cart_modal.html', context)
-        except CartItem.DoesNotExist:
-            return JsonResponse({'error': 'Item not found'}, status=400)
+            return self.render_changes(request, cart, item_ids=[item_id])
+        return JsonResponse({'error': 'Item not found'}, status=400)
         
 class CartCountView(CartMixin, View):
     def get(self, request):
@@ -137,8 +149,7 @@ class ClearCartView(CartMixin, View):
         cart = self.get_cart(request)
         cart.clear()
 
-        request.session['cart_id'] = cart.id
-        request.session.modified = True
+        self.remember_cart(request, cart)
 
         if request.headers.get('HX-Request'):
             return TemplateResponse(request, 'cart/cart_empty.html', {
@@ -154,8 +165,6 @@ class CartSummaryView(CartMixin, View):
         cart = self.get_cart(request)
         context = {
             'cart': cart,
-            'cart_items': cart.items.select_related(
-                'dish',
-            ).order_by('-added_at')
+            'cart_items': cart.get_items()
         }
         return TemplateResponse(request, 'cart/cart_summary.html', context)
\ No newline at end of file
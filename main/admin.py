@@ -1,18 +1,45 @@
 from django.contrib import admin
-from .models import Dish, Category, DishImage, Allergen
+from .images import variants_are_current
+from .models import Dish, Category, DishImage, Allergen, ImageTask
+
+
+def image_status(field_file, variants, task_status):
+    if not field_file:
+        return '—'
+    if variants_are_current(field_file, variants):
+        return 'Готово'
+    if task_status == 'failed':
+        return 'Ошибка обработки'
+    return 'Обрабатывается'
 
 
 class DishImageInLine(admin.TabularInline):
     model = DishImage
     extra = 1
+    readonly_fields = ['processing_status']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(image_task_status=ImageTask.objects.status_for('gallery'))
+
+    @admin.display(description='Статус')
+    def processing_status(self, obj):
+        return image_status(obj.image, obj.variants, getattr(obj, 'image_task_status', None))
 
 class DishAdmin(admin.ModelAdmin):
-    list_display = ['name', 'description', 'category', 'price']
+    list_display = ['name', 'description', 'category', 'price', 'processing_status']
     list_filter = ['category', 'allergens']
     search_fields = ['name']
     prepopulated_fields = {'slug': ('name',)}
     filter_horizontal = ['allergens']
     inlines = [DishImageInLine]
+    readonly_fields = ['processing_status']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(image_task_status=ImageTask.objects.status_for('dish'))
+
+    @admin.display(description='Фото')
+    def processing_status(self, obj):
+        return image_status(obj.main_image, obj.main_image_variants, getattr(obj, 'image_task_status', None))
 
 class Category_Admin(admin.ModelAdmin):
     list_display = ['name', 'slug']
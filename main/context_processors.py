@@ -1,7 +1,7 @@
-from .models import Category
+from .menu import get_menu
 
 def common_context(request):
     return {
-        'categories': Category.objects.all(),
+        'categories': get_menu().categories,
         'current_category': request.resolver_match.kwargs.get('slug') if request.resolver_match else None,
     }
\ No newline at end of file
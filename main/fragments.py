@@ -0,0 +1,68 @@
+"""
+Кеш отрендеренных HTMX-фрагментов меню для анонимных посетителей.
+
+Ключ записи — шаблон, путь, нормализованные параметры фильтров, HX-Request и
+текущие версии её тегов ('menu', 'catalog', 'category:<id>'). Сигналы
+моделей меню увеличивают версии тегов (см. main.signals), после чего
+старые записи перестают читаться и вытесняются по времени жизни. Сами
+фрагменты лежат в кеше 'fragments', версии тегов — в 'default', чтобы
+чистка переполненного кеша фрагментов не сбрасывала версии.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+
+FRAGMENT_TIMEOUT = 60 * 60
+
+
+def tag_key(tag):
+    return f'fragment-tag:{tag}'
+
+
+def get_tag_versions(tags):
+    keys = [tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_tags(*tags):
+    for tag in tags:
+        try:
+            cache.incr(tag_key(tag))
+        except ValueError:
+            cache.set(tag_key(tag), time.time_ns(), timeout=None)
+
+
+def is_cacheable(request):
+    """Фрагмент одинаков для всех анонимных посетителей с одинаковыми параметрами."""
+    return (
+        request.method == 'GET'
+        and bool(request.headers.get('HX-Request'))
+        and not request.user.is_authenticated
+    )
+
+
+def render_fragment(request, template_name, get_context, params, tags):
+    """
+    Ответ с фрагментом из кеша; при промахе get_context() и рендер шаблона
+    выполняются один раз и результат сохраняется.
+    """
+    raw = json.dumps(
+        [template_name, request.path, sorted(params.items()), 'hx', get_tag_versions(tags)],
+        ensure_ascii=False,
+    )
+    key = 'fragment:' + hashlib.md5(raw.encode()).hexdigest()
+    content = caches['fragments'].get(key)
+    if content is None:
+        content = render_to_string(template_name, get_context(), request)
+        caches['fragments'].set(key, content, FRAGMENT_TIMEOUT)
+    return HttpResponse(content)
@@ -0,0 +1,132 @@
+"""
+Производные размеры фотографий блюд.
+
+Из оригинала Dish.main_image или DishImage.image Pillow делает копии шириной
+VARIANT_WIDTHS в WebP и JPEG и сохраняет их через то же хранилище рядом
+с оригиналом (dishes/variants/...). Имена складываются в JSON-поле модели:
+
+    {'source': 'dishes/borsch.png',
+     'webp': {'160': 'dishes/variants/borsch_160.webp', ...},
+     'jpeg': {'160': 'dishes/variants/borsch_160.jpg', ...}}
+
+'source' — имя оригинала, по которому видно, что копии устарели. Рядом
+лежат метаданные оригинала (extract_metadata): 'width', 'height', 'color'
+и 'placeholder', чтобы шаблонам не открывать картинку на запросе.
+"""
+import base64
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+VARIANT_WIDTHS = (160, 480, 1024)
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', 'webp'),
+    ('jpeg', 'JPEG', 'jpg'),
+)
+VARIANT_QUALITY = 80
+PLACEHOLDER_WIDTH = 16
+
+
+def variants_are_current(field_file, variants):
+    return bool(field_file) and (variants or {}).get('source') == field_file.name
+
+
+def variant_name(source_name, width, extension):
+    directory, filename = posixpath.split(source_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'variants', f'{stem}_{width}.{extension}')
+
+
+class BrokenImageError(ValueError):
+    """Файл прочитан из хранилища, но Pillow не может его разобрать: повтор не поможет."""
+
+
+def open_image(field_file):
+    # Ошибки хранилища остаются OSError, ошибки разбора — BrokenImageError
+    with field_file.storage.open(field_file.name, 'rb') as source:
+        data = source.read()
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+        return ImageOps.exif_transpose(image)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as exc:
+        raise BrokenImageError(f'{field_file.name}: {type(exc).__name__}: {exc}') from exc
+
+
+def dominant_color(image):
+    # Самый частый цвет палитры из 8 цветов на уменьшенной копии
+    small = image.copy()
+    small.thumbnail((64, 64))
+    palette_image = small.quantize(colors=8)
+    _, index = max(palette_image.getcolors())
+    red, green, blue = palette_image.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def extract_metadata(image):
+    """Размеры, преобладающий цвет и JPEG-заглушка шириной 16px в data URI."""
+    image = image.convert('RGB')
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    buffer = BytesIO()
+    image.resize((PLACEHOLDER_WIDTH, height), Image.Resampling.BOX).save(buffer, 'JPEG', quality=50)
+    return {
+        'width': image.width,
+        'height': image.height,
+        'color': dominant_color(image),
+        'placeholder': 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii'),
+    }
+
+
+def read_metadata(field_file):
+    return extract_metadata(open_image(field_file))
+
+
+def generate_variants(field_file):
+    """Сделать и сохранить копии оригинала; вернуть словарь для JSON-поля."""
+    storage = field_file.storage
+    image = open_image(field_file).convert('RGB')
+
+    # Не увеличиваем: самый маленький размер делаем всегда, остальные — до ширины оригинала
+    widths = [w for w in VARIANT_WIDTHS if w <= image.width] or [min(VARIANT_WIDTHS)]
+
+    variants = {'source': field_file.name, **extract_metadata(image)}
+    for key, pillow_format, extension in VARIANT_FORMATS:
+        variants[key] = {}
+        for width in widths:
+            if width < image.width:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            else:
+                resized = image
+            buffer = BytesIO()
+            resized.save(buffer, pillow_format, quality=VARIANT_QUALITY, optimize=True)
+
+            name = variant_name(field_file.name, width, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            variants[key][str(width)] = storage.save(name, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def refresh_variants(instance, field_name, variants_field, force=False):
+    """
+    Пересобрать копии, если оригинал сменился, и записать их UPDATE'ом без
+    повторного save() и его сигналов. Возвращает True, если что-то изменилось.
+    """
+    field_file = getattr(instance, field_name)
+    variants = getattr(instance, variants_field)
+    if not field_file:
+        new_variants = {}
+    elif force or not variants_are_current(field_file, variants):
+        new_variants = generate_variants(field_file)
+    else:
+        return False
+    if new_variants == variants:
+        return False
+
+    setattr(instance, variants_field, new_variants)
+    type(instance).objects.filter(pk=instance.pk).update(**{variants_field: new_variants})
+    return True
@@ -0,0 +1,88 @@
+"""
+Команда для заполнения метаданных фото блюд: размеров, преобладающего цвета
+и заглушки. Оригиналы читаются из хранилища параллельно в несколько потоков.
+Фото без актуальных копий пропускает — метаданные для них посчитает
+build_image_variants вместе с копиями.
+Использование: python manage.py build_image_metadata [--workers 8] [--batch-size 200] [--force]
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from main.fragments import bump_tags
+from main.images import BrokenImageError, read_metadata, variants_are_current
+from main.menu import bump_menu_version
+from main.models import Dish, DishImage
+
+
+class Command(BaseCommand):
+    help = 'Заполняет размеры, цвет и заглушки фото блюд без пересоздания копий'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Сколько фото читать из хранилища одновременно',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Сколько фото обрабатывать и сохранять за раз',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересчитать метаданные, даже если они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        sources = (
+            (Dish.objects.exclude(main_image=''), 'main_image', 'main_image_variants'),
+            (DishImage.objects.all(), 'image', 'variants'),
+        )
+
+        updated = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for queryset, field_name, variants_field in sources:
+                if not options['force']:
+                    queryset = queryset.exclude(**{f'{variants_field}__has_key': 'placeholder'})
+                queryset = queryset.only('pk', field_name, variants_field).order_by('pk')
+
+                batch = []
+                for instance in queryset.iterator(chunk_size=options['batch_size']):
+                    if variants_are_current(getattr(instance, field_name), getattr(instance, variants_field)):
+                        batch.append(instance)
+                    if len(batch) == options['batch_size']:
+                        done, errors = self.process(executor, batch, field_name, variants_field)
+                        updated, failed, batch = updated + done, failed + errors, []
+                if batch:
+                    done, errors = self.process(executor, batch, field_name, variants_field)
+                    updated, failed = updated + done, failed + errors
+
+        if updated:
+            bump_menu_version()
+            bump_tags('menu', 'catalog')
+        self.stdout.write(self.style.SUCCESS(f'Готово. Обновлено фото: {updated}, ошибок: {failed}'))
+
+    def process(self, executor, batch, field_name, variants_field):
+        def read(instance):
+            try:
+                return read_metadata(getattr(instance, field_name))
+            except (OSError, BrokenImageError) as exc:
+                return exc
+
+        changed = []
+        failed = 0
+        # Потоки только читают хранилище и считают Pillow; в базу пишем отсюда одним bulk_update
+        for instance, metadata in zip(batch, executor.map(read, batch)):
+            if isinstance(metadata, (OSError, BrokenImageError)):
+                failed += 1
+                self.stderr.write(f'{getattr(instance, field_name).name}: {metadata}')
+                continue
+            setattr(instance, variants_field, {**getattr(instance, variants_field), **metadata})
+            changed.append(instance)
+
+        type(batch[0]).objects.bulk_update(changed, [variants_field])
+        return len(changed), failed
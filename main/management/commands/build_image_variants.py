@@ -0,0 +1,45 @@
+"""
+Команда для создания уменьшенных копий фотографий блюд (WebP и JPEG).
+Пропускает фотографии, копии которых уже сделаны из текущего оригинала.
+Использование: python manage.py build_image_variants [--force]
+"""
+from django.core.management.base import BaseCommand
+
+from main.fragments import bump_tags
+from main.images import BrokenImageError, refresh_variants
+from main.menu import bump_menu_version
+from main.models import Dish, DishImage
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии основных фото блюд и фото галереи'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии, даже если они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        force = options['force']
+        sources = (
+            (Dish.objects.exclude(main_image='').only('pk', 'main_image', 'main_image_variants'),
+             'main_image', 'main_image_variants'),
+            (DishImage.objects.only('pk', 'image', 'variants'), 'image', 'variants'),
+        )
+
+        updated = failed = 0
+        for queryset, field_name, variants_field in sources:
+            for instance in queryset.order_by('pk').iterator(chunk_size=200):
+                try:
+                    if refresh_variants(instance, field_name, variants_field, force=force):
+                        updated += 1
+                except (OSError, BrokenImageError) as exc:
+                    failed += 1
+                    self.stderr.write(f'{getattr(instance, field_name).name}: {exc}')
+
+        if updated:
+            bump_menu_version()
+            bump_tags('menu', 'catalog')
+        self.stdout.write(self.style.SUCCESS(f'Готово. Обновлено фото: {updated}, ошибок: {failed}'))
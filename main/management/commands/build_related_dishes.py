@@ -0,0 +1,150 @@
+"""
+Команда для подбора «похожих блюд» по совместным покупкам.
+Идёт по заказам, изменённым после прошлого запуска (курсор по updated_at и id),
+и пересчитывает соседей лишь у затронутых блюд. Заказ, ставший оплаченным
+(Order.PAID_STATUSES), добавляет свои пары и запоминается в CoPurchaseOrder;
+заказ, переставший быть оплаченным или удалённый, вычитает их обратно.
+Заказы моложе --lag-minutes ждут следующего запуска: их транзакции могли
+ещё не зафиксироваться.
+Использование: python manage.py build_related_dishes [--top N] [--batch-size N] [--lag-minutes N]
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import combinations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from main.menu import bump_menu_version
+from main.models import CoPurchaseOrder, DishNeighbor, DishPairCount, RecommendationCheckpoint
+from orders.models import Order, OrderItem
+
+
+CHECKPOINT_NAME = 'related_dishes'
+
+
+def dish_pairs(dish_ids):
+    return set(combinations(sorted(dish_ids), 2))
+
+
+class Command(BaseCommand):
+    help = 'Считает пары блюд из одних заказов и сохраняет ближайших соседей каждого блюда'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=8,
+            help='Сколько соседей хранить для каждого блюда',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Сколько изменённых заказов обрабатывать за одну транзакцию',
+        )
+        parser.add_argument(
+            '--lag-minutes',
+            type=int,
+            default=15,
+            help='Заказы, изменённые позже, ждут следующего запуска',
+        )
+
+    def handle(self, *args, **options):
+        top = max(options['top'], 1)
+        batch_size = max(options['batch_size'], 1)
+        RecommendationCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+
+        cutoff = timezone.now() - timedelta(minutes=max(options['lag_minutes'], 0))
+
+        processed = 0
+        touched = set()
+        with transaction.atomic():
+            # Удалённые учтённые заказы; блокировка отметки не даёт двум запускам вычесть их дважды
+            RecommendationCheckpoint.objects.select_for_update().get(name=CHECKPOINT_NAME)
+            touched.update(self.forget_orders(CoPurchaseOrder.objects.filter(order=None)))
+
+        while True:
+            with transaction.atomic():
+                checkpoint = RecommendationCheckpoint.objects.select_for_update().get(name=CHECKPOINT_NAME)
+                orders = Order.objects.filter(updated_at__lt=cutoff)
+                if checkpoint.last_at is not None:
+                    orders = orders.filter(
+                        Q(updated_at__gt=checkpoint.last_at)
+                        | Q(updated_at=checkpoint.last_at, pk__gt=checkpoint.last_id)
+                    )
+                changed = list(
+                    orders.order_by('updated_at', 'pk').values_list('pk', 'status', 'updated_at')[:batch_size]
+                )
+                if not changed:
+                    break
+
+                counted = set(
+                    CoPurchaseOrder.objects.filter(order_id__in=[pk for pk, _, _ in changed])
+                    .values_list('order_id', flat=True)
+                )
+                paid = [pk for pk, status, _ in changed if status in Order.PAID_STATUSES and pk not in counted]
+                unpaid = [pk for pk, status, _ in changed if status not in Order.PAID_STATUSES and pk in counted]
+                touched.update(self.count_orders(paid))
+                touched.update(self.forget_orders(CoPurchaseOrder.objects.filter(order_id__in=unpaid)))
+
+                checkpoint.last_id, _, checkpoint.last_at = changed[-1]
+                checkpoint.save(update_fields=['last_id', 'last_at', 'updated_at'])
+                processed += len(changed)
+
+        if touched:
+            with transaction.atomic():
+                self.rebuild_neighbors(touched, top)
+            # Соседи читаются из снимка меню
+            bump_menu_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Изменённых заказов: {processed}, блюд с обновлёнными соседями: {len(touched)}'
+        ))
+
+    def count_orders(self, order_ids):
+        """Добавить пары блюд оплаченных заказов: пара считается один раз на заказ."""
+        dishes = defaultdict(set)
+        items = OrderItem.objects.filter(order_id__in=order_ids)
+        for order_id, dish_id in items.values_list('order_id', 'dish_id'):
+            dishes[order_id].add(dish_id)
+
+        counts = Counter()
+        for dish_ids in dishes.values():
+            counts.update(dish_pairs(dish_ids))
+        DishPairCount.objects.add_counts(counts)
+        CoPurchaseOrder.objects.bulk_create([
+            CoPurchaseOrder(order_id=order_id, dish_ids=sorted(dishes[order_id])) for order_id in order_ids
+        ])
+        return {dish_id for pair in counts for dish_id in pair}
+
+    def forget_orders(self, records):
+        """Вычесть пары учтённых заказов и забыть их."""
+        records = list(records)
+        counts = Counter()
+        for record in records:
+            counts.update(dish_pairs(record.dish_ids))
+        DishPairCount.objects.subtract_counts(counts)
+        CoPurchaseOrder.objects.filter(pk__in=[record.pk for record in records]).delete()
+        return {dish_id for pair in counts for dish_id in pair}
+
+    def rebuild_neighbors(self, dish_ids, top):
+        neighbors = defaultdict(list)
+        pairs = (
+            DishPairCount.objects.filter(dish_id__in=dish_ids)
+            .order_by('dish_id', '-count', 'other_id')
+            .values_list('dish_id', 'other_id', 'count')
+        )
+        for dish_id, other_id, count in pairs.iterator():
+            if len(neighbors[dish_id]) < top:
+                neighbors[dish_id].append(
+                    DishNeighbor(dish_id=dish_id, neighbor_id=other_id,
+                                 rank=len(neighbors[dish_id]), score=count)
+                )
+
+        DishNeighbor.objects.filter(dish_id__in=dish_ids).delete()
+        DishNeighbor.objects.bulk_create(
+            [neighbor for items in neighbors.values() for neighbor in items], batch_size=1000,
+        )
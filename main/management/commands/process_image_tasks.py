@@ -0,0 +1,52 @@
+"""
+Воркер очереди фото блюд: делает копии и метаданные для загруженных фото.
+Без --once работает постоянно и опрашивает очередь раз в --interval секунд.
+Использование: python manage.py process_image_tasks [--interval 5] [--batch-size 10] [--once]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.tasks import claim_tasks, requeue_stale, run_task
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь загруженных фото блюд'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза в секундах, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Сколько задач забирать за раз',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь и выйти',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        processed = 0
+        try:
+            while True:
+                requeue_stale()
+                tasks = claim_tasks(batch_size)
+                for task in tasks:
+                    run_task(task)
+                processed += len(tasks)
+
+                if not tasks:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Готово. Обработано задач: {processed}'))
@@ -0,0 +1,50 @@
+"""
+Команда для пересчёта битовых масок аллергенов у блюд и пользователей.
+Использование: python manage.py rebuild_allergen_masks
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.fragments import bump_tags
+from main.menu import bump_menu_version
+from main.models import Allergen, Dish
+from users.models import CustomUser
+from users.signals import refresh_masks
+
+
+class Command(BaseCommand):
+    help = 'Назначает аллергенам биты и пересчитывает маски блюд и пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько блюд или пользователей пересчитывать за один проход',
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+
+        assigned = 0
+        for allergen in Allergen.objects.filter(bit=None).order_by('pk'):
+            allergen.save()
+            assigned += 1
+
+        dishes = 0
+        dish_ids = list(Dish.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(dish_ids), batch_size):
+            dishes += Dish.objects.filter(pk__in=dish_ids[start:start + batch_size]).refresh_allergen_masks()
+
+        user_ids = list(CustomUser.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(user_ids), batch_size):
+            refresh_masks(user_ids[start:start + batch_size])
+
+        # Каталог фильтрует по маскам из снимка меню: без новой версии починка не видна
+        transaction.on_commit(bump_menu_version)
+        transaction.on_commit(lambda: bump_tags('menu', 'catalog'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Назначено битов: {assigned}, блюд: {dishes}, пользователей: {len(user_ids)}'
+        ))
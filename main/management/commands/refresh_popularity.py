@@ -0,0 +1,119 @@
+"""
+Команда для пересчёта популярности блюд за 7 и 30 дней.
+Идёт по заказам, изменённым после прошлого запуска (курсор по updated_at и id),
+и пересобирает дневные корзины DishDailySales только за дни этих заказов;
+остальные корзины не трогаются. Корзины старше 30 дней удаляются, окна
+собираются из корзин. Заказы моложе --lag-minutes ждут следующего запуска.
+Использование: python manage.py refresh_popularity [--batch-size N] [--lag-minutes N]
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from main.fragments import bump_tags
+from main.menu import bump_menu_version
+from main.models import Dish, DishDailySales, DishPopularity, RecommendationCheckpoint
+from main.sales import rebuild_sales_days
+from orders.models import Order
+
+
+CHECKPOINT_NAME = 'popularity'
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает дневные продажи за изменившиеся дни и рейтинг популярности блюд'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Сколько изменённых заказов читать за раз',
+        )
+        parser.add_argument(
+            '--lag-minutes',
+            type=int,
+            default=15,
+            help='Заказы, изменённые позже, ждут следующего запуска',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        cutoff = timezone.now() - timedelta(minutes=max(options['lag_minutes'], 0))
+        longest = max(window for window, _ in DishPopularity.WINDOW_CHOICES)
+        oldest = timezone.localdate() - timedelta(days=longest - 1)
+        RecommendationCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+
+        with transaction.atomic():
+            checkpoint = RecommendationCheckpoint.objects.select_for_update().get(name=CHECKPOINT_NAME)
+            if checkpoint.last_at is None:
+                # Первый запуск: собрать всё окно, дальше — только изменения
+                days = {oldest + timedelta(days=n) for n in range(longest)}
+                last = (
+                    Order.objects.filter(updated_at__lt=cutoff).order_by('-updated_at', '-pk')
+                    .values_list('pk', 'updated_at').first()
+                )
+                if last is not None:
+                    checkpoint.last_id, checkpoint.last_at = last
+            else:
+                days = self.changed_days(checkpoint, cutoff, oldest, batch_size)
+
+            buckets = rebuild_sales_days(days)
+            DishDailySales.objects.filter(day__lt=oldest).delete()
+            checkpoint.save(update_fields=['last_id', 'last_at', 'updated_at'])
+            ranked = self.rebuild_windows()
+
+        # Рейтинг читается из снимка меню и попадает в кешированную главную
+        bump_menu_version()
+        bump_tags('menu')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Пересобрано дней: {len(days)}, дневных корзин: {buckets}, записей рейтинга: {ranked}'
+        ))
+
+    def changed_days(self, checkpoint, cutoff, oldest, batch_size):
+        """Дни (по дате создания) заказов, изменённых после отметки; отметка сдвигается."""
+        days = set()
+        while True:
+            changed = list(
+                Order.objects.filter(updated_at__lt=cutoff)
+                .filter(
+                    Q(updated_at__gt=checkpoint.last_at)
+                    | Q(updated_at=checkpoint.last_at, pk__gt=checkpoint.last_id)
+                )
+                .order_by('updated_at', 'pk').values_list('pk', 'updated_at', 'created_at')[:batch_size]
+            )
+            if not changed:
+                return days
+            days.update(
+                day for day in (timezone.localdate(created_at) for _, _, created_at in changed)
+                if day >= oldest
+            )
+            checkpoint.last_id, checkpoint.last_at, _ = changed[-1]
+
+    def rebuild_windows(self):
+        today = timezone.localdate()
+        categories = dict(Dish.objects.values_list('pk', 'category_id'))
+        rows = []
+        for window, _ in DishPopularity.WINDOW_CHOICES:
+            totals = (
+                DishDailySales.objects.filter(day__gt=today - timedelta(days=window))
+                .values('dish_id').annotate(total=Sum('quantity'))
+                .filter(total__gt=0).order_by('-total', 'dish_id')
+                .values_list('dish_id', 'total')
+            )
+            category_ranks = defaultdict(int)
+            for rank, (dish_id, total) in enumerate(totals, start=1):
+                category_ranks[categories[dish_id]] += 1
+                rows.append(DishPopularity(
+                    dish_id=dish_id, window=window, quantity=total,
+                    rank=rank, category_rank=category_ranks[categories[dish_id]],
+                ))
+
+        DishPopularity.objects.all().delete()
+        DishPopularity.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
@@ -0,0 +1,28 @@
+"""
+Публичные URL медиафайлов без обращения к хранилищу.
+
+Файлы в бакете MinIO публичны, и их URL — это MEDIA_URL плюс имя файла, но
+storage.url() MinioMediaStorage на каждый вызов делает работу клиента MinIO.
+media_url() строит ту же строку сам и запоминает её по имени файла.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.encoding import filepath_to_uri
+
+
+MEDIA_URL_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=MEDIA_URL_CACHE_SIZE)
+def _build_media_url(base_url, name):
+    return base_url + filepath_to_uri(name).lstrip('/')
+
+
+def media_url(file_or_name):
+    """URL файла по FieldFile или имени; '' для пустого поля."""
+    name = getattr(file_or_name, 'name', file_or_name)
+    if not name:
+        return ''
+    # MEDIA_URL в ключе: override_settings в тестах не получит чужие URL
+    return _build_media_url(settings.MEDIA_URL, name)
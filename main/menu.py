@@ -0,0 +1,318 @@
+"""
+Снимок меню в памяти процесса.
+
+Категории, блюда и их аллергены (несколько сотен строк) собираются
+несколькими запросами в неизменяемую структуру с индексами по slug,
+id и категории. Снимок пересобирается, когда меняется версия меню
+в общем кеше — её увеличивают сигналы моделей меню (см. main.signals).
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import chain, islice
+from types import MappingProxyType
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Category, Dish, DishNeighbor, DishPopularity
+
+
+MENU_VERSION_KEY = 'menu:version'
+MENU_CHANGED_KEY = 'menu:changed_at'
+PRICE_STEP = Decimal('0.01')
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+def get_menu_version():
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        # Начальное значение уникально, чтобы перезапуск кеша не вернул старую версию
+        cache.add(MENU_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    try:
+        cache.incr(MENU_VERSION_KEY)
+    except ValueError:
+        cache.set(MENU_VERSION_KEY, time.time_ns(), timeout=None)
+    # Удаления и правки категорий не двигают Dish.updated_at
+    cache.set(MENU_CHANGED_KEY, timezone.now(), timeout=None)
+
+
+def parse_price(value):
+    try:
+        return Decimal(value) if value not in (None, '') else None
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def catalog_key(dish):
+    return (dish.created_at, dish.pk)
+
+
+def seek(dishes, after):
+    """Позиция первого блюда с ключом меньше after в списке по убыванию ключа."""
+    lo, hi = 0, len(dishes)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if catalog_key(dishes[mid]) < after:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+def encode_cursor(key):
+    created_at, pk = key
+    return f'{(created_at - _EPOCH) // timedelta(microseconds=1)}_{pk}'
+
+
+def decode_cursor(value):
+    """Ключ (created_at, id) из курсора; None для пустого или испорченного."""
+    try:
+        micros, pk = (int(part) for part in value.split('_'))
+        return (_EPOCH + timedelta(microseconds=micros), pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def price_bucket_edges(prices, buckets=4):
+    """Границы ценовых корзин по квантилям цен меню, округлённые до десятков."""
+    prices = sorted(prices)
+    edges = []
+    for i in range(1, buckets):
+        edge = (prices[len(prices) * i // buckets] / 10).to_integral_value() * 10 if prices else None
+        if edge and edge > prices[0] and (not edges or edge > edges[-1]):
+            edges.append(edge)
+    return tuple(edges)
+
+
+class MenuSnapshot:
+    """Неизменяемый снимок меню. Экземпляры моделей внутри только для чтения."""
+
+    def __init__(self, version, categories, dishes, neighbors=(), popularity=(), changed_at=None):
+        self.version = version
+        self.categories = tuple(categories)
+        self.categories_by_slug = MappingProxyType({c.slug: c for c in self.categories})
+
+        # Порядок каталога: сначала новые, как order_by('-created_at', '-id')
+        self.dishes = tuple(sorted(dishes, key=catalog_key, reverse=True))
+        self.dishes_by_id = MappingProxyType({d.pk: d for d in self.dishes})
+        self.dishes_by_slug = MappingProxyType({d.slug: d for d in self.dishes})
+
+        by_category = {}
+        for dish in self.dishes:
+            by_category.setdefault(dish.category_id, []).append(dish)
+        self.dishes_by_category = MappingProxyType(
+            {category_id: tuple(items) for category_id, items in by_category.items()}
+        )
+
+        # Соседи по совместным покупкам (DishNeighbor) в порядке ранга
+        by_dish = {}
+        for dish_id, neighbor_id in neighbors:
+            if neighbor_id in self.dishes_by_id:
+                by_dish.setdefault(dish_id, []).append(self.dishes_by_id[neighbor_id])
+        self.neighbors = MappingProxyType({dish_id: tuple(items) for dish_id, items in by_dish.items()})
+
+        # Рейтинг популярности (DishPopularity): окно в днях -> блюда по месту
+        by_window = {}
+        for window, dish_id in popularity:
+            if dish_id in self.dishes_by_id:
+                by_window.setdefault(window, []).append(self.dishes_by_id[dish_id])
+        self.popular_by_window = MappingProxyType({window: tuple(items) for window, items in by_window.items()})
+
+        self._search_names = MappingProxyType({d.pk: d.name.casefold() for d in self.dishes})
+
+        # Аллергены, которые встречаются в меню, — из уже загруженных связей блюд
+        allergens = {a.pk: a for d in self.dishes for a in d.allergens.all() if a.bit is not None}
+        self.allergens = tuple(sorted(allergens.values(), key=lambda a: a.name))
+        self.price_edges = price_bucket_edges([d.price for d in self.dishes])
+
+        # Префиксный индекс подсказок: название целиком и каждое слово названия
+        self._prefixes = sorted(
+            {(word, d.pk) for d in self.dishes
+             for word in (self._search_names[d.pk], *self._search_names[d.pk].split())}
+        )
+        self._prefix_keys = [word for word, _ in self._prefixes]
+
+        self.last_modified = max(
+            (d.updated_at for d in self.dishes), default=changed_at,
+        )
+        if changed_at is not None:
+            self.last_modified = max(self.last_modified, changed_at)
+
+    @classmethod
+    def build(cls, version):
+        categories = list(Category.objects.order_by('pk'))
+        dishes = list(Dish.objects.for_cards().prefetch_related('images'))
+        neighbors = DishNeighbor.objects.order_by('dish_id', 'rank').values_list('dish_id', 'neighbor_id')
+        popularity = DishPopularity.objects.order_by('window', 'rank').values_list('window', 'dish_id')
+        return cls(
+            version, categories, dishes, neighbors, popularity,
+            changed_at=cache.get(MENU_CHANGED_KEY),
+        )
+
+    def iter_dishes(self, category=None, min_price=None, max_price=None,
+                    query=None, excluded_mask=0, dish_ids=None, after=None):
+        """
+        Аналог фильтров каталога по queryset: блюда в порядке каталога.
+
+        dish_ids — уже найденные поиском id в порядке релевантности; тогда
+        порядок берётся из них, а query не применяется. after — ключ
+        (created_at, id) последнего показанного блюда: выдача продолжается
+        с позиции после него, без перебора предыдущих страниц.
+        """
+        if dish_ids is not None:
+            dishes = [self.dishes_by_id[pk] for pk in dish_ids if pk in self.dishes_by_id]
+            if after is not None:
+                keys = [catalog_key(d) for d in dishes]
+                dishes = dishes[keys.index(after) + 1:] if after in keys else []
+            query = None
+        else:
+            if category is not None:
+                dishes = self.dishes_by_category.get(category.pk, ())
+            else:
+                dishes = self.dishes
+            if after is not None:
+                dishes = islice(dishes, seek(dishes, after), None)
+
+        needle = query.casefold() if query else None
+        for dish in dishes:
+            if category is not None and dish.category_id != category.pk:
+                continue
+            if min_price is not None and dish.price < min_price:
+                continue
+            if max_price is not None and dish.price > max_price:
+                continue
+            if needle and needle not in self._search_names[dish.pk]:
+                continue
+            if dish.allergen_mask & excluded_mask:
+                continue
+            yield dish
+
+    def page(self, size, after=None, **filters):
+        """Страница из size блюд и ключ для следующей (None, если это последняя)."""
+        dishes = list(islice(self.iter_dishes(after=after, **filters), size + 1))
+        if len(dishes) > size:
+            return dishes[:size], catalog_key(dishes[size - 1])
+        return dishes, None
+
+    def facets(self, category=None, min_price=None, max_price=None,
+                query=None, excluded_mask=0, dish_ids=None):
+        """
+        Счётчики для модального окна фильтров за один проход по результатам поиска.
+
+        Каждый фасет считается с учётом остальных фильтров, но без своего:
+        категории — без выбранной категории, цены — без диапазона цен.
+        """
+        total = 0
+        by_category = Counter()
+        by_bucket = Counter()
+        by_bit = Counter()
+        for dish in self.iter_dishes(query=query, dish_ids=dish_ids, excluded_mask=excluded_mask):
+            in_category = category is None or dish.category_id == category.pk
+            in_price = (
+                (min_price is None or dish.price >= min_price)
+                and (max_price is None or dish.price <= max_price)
+            )
+            if in_price:
+                by_category[dish.category_id] += 1
+            if in_category:
+                by_bucket[bisect_right(self.price_edges, dish.price)] += 1
+            if in_category and in_price:
+                total += 1
+                mask = dish.allergen_mask
+                while mask:
+                    bit = mask.bit_length() - 1
+                    by_bit[bit] += 1
+                    mask ^= 1 << bit
+
+        edges = (None, *self.price_edges, None)
+        return {
+            'total': total,
+            'categories': [(c, by_category[c.pk]) for c in self.categories],
+            'allergens': [(a, total - by_bit[a.bit]) for a in self.allergens],
+            # Корзина [min, max): для фильтра max_price (включительно) на копейку меньше
+            'price_buckets': [
+                {
+                    'min': edges[i],
+                    'max': edges[i + 1],
+                    'max_price': edges[i + 1] - PRICE_STEP if edges[i + 1] is not None else None,
+                    'count': by_bucket[i],
+                }
+                for i in range(len(edges) - 1)
+            ],
+        }
+
+    def related(self, dish, excluded_mask=0, limit=4):
+        """
+        Блюда, которые заказывают вместе с dish; если данных о заказах мало,
+        список дополняется другими блюдами категории в порядке каталога.
+        """
+        candidates = chain(
+            self.neighbors.get(dish.pk, ()),
+            self.dishes_by_category.get(dish.category_id, ()),
+        )
+        related = {}
+        for other in candidates:
+            if other.pk != dish.pk and not other.allergen_mask & excluded_mask:
+                related.setdefault(other.pk, other)
+                if len(related) == limit:
+                    break
+        return list(related.values())
+
+    def popular(self, window=7, excluded_mask=0, limit=6, category=None):
+        """
+        Самые продаваемые блюда за окно; пока продаж мало, список дополняется
+        новинками каталога.
+        """
+        candidates = chain(self.popular_by_window.get(window, ()), self.dishes)
+        popular = {}
+        for dish in candidates:
+            if category is not None and dish.category_id != category.pk:
+                continue
+            if not dish.allergen_mask & excluded_mask:
+                popular.setdefault(dish.pk, dish)
+                if len(popular) == limit:
+                    break
+        return list(popular.values())
+
+    def suggest(self, prefix, limit):
+        """Блюда, название или слово названия которых начинается с prefix."""
+        prefix = prefix.casefold()
+        found = {}
+        start = bisect_left(self._prefix_keys, prefix)
+        for word, pk in self._prefixes[start:]:
+            if not word.startswith(prefix):
+                break
+            found.setdefault(pk, self.dishes_by_id[pk])
+        # Сначала совпадения с началом названия, затем по алфавиту
+        return sorted(
+            found.values(),
+            key=lambda d: (not self._search_names[d.pk].startswith(prefix), self._search_names[d.pk]),
+        )[:limit]
+
+
+def get_menu():
+    """Текущий снимок меню процесса; пересобирается при смене версии."""
+    global _snapshot
+    version = get_menu_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = MenuSnapshot.build(version)
+        return _snapshot
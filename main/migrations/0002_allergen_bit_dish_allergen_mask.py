@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:02
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_allergen_masks(apps, schema_editor):
+    Allergen = apps.get_model('main', 'Allergen')
+    Dish = apps.get_model('main', 'Dish')
+    for bit, allergen in enumerate(Allergen.objects.order_by('pk')[:63]):
+        allergen.bit = bit
+        allergen.save(update_fields=['bit'])
+
+    masks = defaultdict(int)
+    links = Dish.allergens.through.objects.exclude(allergen__bit=None)
+    for dish_id, bit in links.values_list('dish_id', 'allergen__bit'):
+        masks[dish_id] |= 1 << bit
+    dishes = list(Dish.objects.only('pk'))
+    for dish in dishes:
+        dish.allergen_mask = masks[dish.pk]
+    Dish.objects.bulk_update(dishes, ['allergen_mask'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allergen',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='allergen_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_allergen_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.2 on 2026-10-18 12:40
+
+from django.db import migrations
+
+
+# Колонка существует только в PostgreSQL и не описана в модели:
+# её читает main.search сырым SQL, остальные СУБД ищут по снимку меню.
+ADD_SEARCH_VECTOR = """
+ALTER TABLE main_dish ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+) STORED;
+CREATE INDEX main_dish_search_vector_gin ON main_dish USING gin (search_vector);
+"""
+
+DROP_SEARCH_VECTOR = """
+DROP INDEX IF EXISTS main_dish_search_vector_gin;
+ALTER TABLE main_dish DROP COLUMN IF EXISTS search_vector;
+"""
+
+
+def add_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(ADD_SEARCH_VECTOR)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_allergen_bit_dish_allergen_mask'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
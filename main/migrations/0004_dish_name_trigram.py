@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-18 13:15
+
+from django.db import migrations
+
+
+ADD_TRIGRAM_INDEX = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX main_dish_name_trgm ON main_dish USING gin (name gin_trgm_ops);
+"""
+
+DROP_TRIGRAM_INDEX = """
+DROP INDEX IF EXISTS main_dish_name_trgm;
+"""
+
+
+def add_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(ADD_TRIGRAM_INDEX)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGRAM_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_dish_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_trigram_index, drop_trigram_index),
+    ]
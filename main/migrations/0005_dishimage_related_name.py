@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_dish_name_trigram'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dishimage',
+            name='dish',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='main.dish'),
+        ),
+    ]
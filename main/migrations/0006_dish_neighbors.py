@@ -0,0 +1,49 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_dishimage_related_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DishNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.PositiveIntegerField()),
+                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='main.dish')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.dish')),
+            ],
+            options={
+                'ordering': ['dish', 'rank'],
+                'unique_together': {('dish', 'rank')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DishPairCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.dish')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.dish')),
+            ],
+            options={
+                'unique_together': {('dish', 'other')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_dish_neighbors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DishDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.dish')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='main_dishda_day_f0d237_idx')],
+                'unique_together': {('dish', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DishPopularity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.PositiveSmallIntegerField(choices=[(7, '7 дней'), (30, '30 дней')])),
+                ('quantity', models.PositiveIntegerField()),
+                ('rank', models.PositiveIntegerField()),
+                ('category_rank', models.PositiveIntegerField()),
+                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='main.dish')),
+            ],
+            options={
+                'ordering': ['window', 'rank'],
+                'indexes': [models.Index(fields=['window', 'rank'], name='main_dishpo_window_660971_idx')],
+                'unique_together': {('dish', 'window')},
+            },
+        ),
+    ]
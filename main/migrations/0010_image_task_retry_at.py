@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-18 21:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_image_tasks'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='imagetask',
+            name='main_imaget_status_07b697_idx',
+        ),
+        migrations.AddField(
+            model_name='imagetask',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='imagetask',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='main_imaget_status_7a2be3_idx'),
+        ),
+    ]
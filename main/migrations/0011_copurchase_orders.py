@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-18 22:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def reset_co_purchases(apps, schema_editor):
+    # Прежние счётчики не знают, какие заказы в них учтены, и вычесть их нельзя:
+    # следующий build_related_dishes посчитает всё заново
+    apps.get_model('main', 'DishPairCount').objects.all().delete()
+    apps.get_model('main', 'DishNeighbor').objects.all().delete()
+    apps.get_model('main', 'RecommendationCheckpoint').objects.filter(name='related_dishes').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_image_task_retry_at'),
+        ('orders', '0003_order_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationcheckpoint',
+            name='last_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CoPurchaseOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dish_ids', models.JSONField(default=list)),
+                ('order', models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='orders.order')),
+            ],
+        ),
+        migrations.RunPython(reset_co_purchases, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,39 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import connection, models
+from django.utils import timezone
 from django.utils.text import slugify
 
 
+# Маски хранятся в BigIntegerField, знаковый бит не используем
+MAX_ALLERGEN_BITS = 63
+
+
+def allergen_mask(bits):
+    """Битовая маска по номерам битов аллергенов."""
+    mask = 0
+    for bit in bits:
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+class AllergenManager(models.Manager):
+    def next_free_bit(self):
+        used = set(self.exclude(bit=None).values_list('bit', flat=True))
+        for bit in range(MAX_ALLERGEN_BITS):
+            if bit not in used:
+                return bit
+        raise ValueError(f'Нельзя завести больше {MAX_ALLERGEN_BITS} аллергенов')
+
+
 class Allergen(models.Model):
     """Аллерген для маркировки блюд."""
     name = models.CharField(max_length=80)
     slug = models.SlugField(max_length=80, unique=True)
+    bit = models.PositiveSmallIntegerField(unique=True, null=True, editable=False)
+
+    objects = AllergenManager()
 
     class Meta:
         verbose_name = 'аллерген'
@@ -18,6 +46,8 @@ class Allergen(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        if self.bit is None:
+            self.bit = Allergen.objects.next_free_bit()
         super().save(*args, **kwargs)
 
 
@@ -32,7 +62,29 @@ class Category(models.Model):
 
     def __str__(self):
         return self.name
-    
+
+
+class DishQuerySet(models.QuerySet):
+    def for_cards(self):
+        """Всё, что нужно карточке блюда, за фиксированное число запросов."""
+        return self.select_related('category').prefetch_related('allergens')
+
+    def refresh_allergen_masks(self):
+        """Пересчитать allergen_mask по связям блюд с аллергенами."""
+        links = Dish.allergens.through.objects.filter(
+            dish__in=self.values('pk'),
+        ).values_list('dish_id', 'allergen__bit')
+        bits = defaultdict(list)
+        for dish_id, bit in links:
+            bits[dish_id].append(bit)
+
+        dishes = list(self.only('pk', 'allergen_mask'))
+        for dish in dishes:
+            dish.allergen_mask = allergen_mask(bits[dish.pk])
+        Dish.objects.bulk_update(dishes, ['allergen_mask'], batch_size=500)
+        return len(dishes)
+
+
 class Dish(models.Model):
     name = models.CharField(max_length=100)
     slug = models.CharField(max_length=100, unique=True,)
@@ -40,10 +92,14 @@ class Dish(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     main_image = models.ImageField(upload_to='dishes/', blank=True)
+    main_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     allergens = models.ManyToManyField(Allergen, related_name='dishes', blank=True, verbose_name='аллергены')
+    allergen_mask = models.BigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DishQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -53,5 +109,175 @@ class Dish(models.Model):
         return self.name
     
 class DishImage(models.Model):
-    dish = models.ForeignKey(Dish, on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='dishes/')
\ No newline at end of file
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='images')
+    image = models.ImageField(upload_to='dishes/')
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+
+class RecommendationCheckpoint(models.Model):
+    """
+    Позиция инкрементального пересчёта по заказам: время изменения и id
+    последнего обработанного заказа (build_related_dishes) или граница,
+    до которой дни уже не пересчитываются (refresh_popularity).
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    last_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.last_id}'
+
+
+def add_counts(model, key_fields, count_field, rows):
+    """
+    Прибавить счётчики строкам (ключ..., n) через INSERT ... ON CONFLICT,
+    не читая существующие строки: ключ — уникальный набор key_fields.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = [model._meta.get_field(name).column for name in (*key_fields, count_field)]
+    count_column = columns[-1]
+    sql = (
+        f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))}) '
+        f'ON CONFLICT ({", ".join(columns[:-1])}) '
+        f'DO UPDATE SET {count_column} = {table}.{count_column} + EXCLUDED.{count_column}'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+class DishPairCountManager(models.Manager):
+    def add_counts(self, counts):
+        """Прибавить счётчики {(dish_id, other_id): n}; пара записывается в обе стороны."""
+        rows = []
+        for (dish_id, other_id), count in counts.items():
+            rows.append((dish_id, other_id, count))
+            rows.append((other_id, dish_id, count))
+        add_counts(self.model, ('dish', 'other'), 'count', rows)
+
+    def subtract_counts(self, counts):
+        """Вычесть счётчики {(dish_id, other_id): n} с обеих сторон; обнулившиеся пары удаляются."""
+        by_count = defaultdict(list)
+        for (dish_id, other_id), count in counts.items():
+            by_count[count].append(models.Q(dish_id=dish_id, other_id=other_id))
+            by_count[count].append(models.Q(dish_id=other_id, other_id=dish_id))
+        for count, conditions in by_count.items():
+            condition = models.Q()
+            for pair in conditions:
+                condition |= pair
+            self.filter(condition).update(count=models.F('count') - count)
+        self.filter(count__lte=0).delete()
+
+
+class DishPairCount(models.Model):
+    """Сколько заказов содержат оба блюда. Хранится в обе стороны пары."""
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    objects = DishPairCountManager()
+
+    class Meta:
+        unique_together = ('dish', 'other')
+
+
+class CoPurchaseOrder(models.Model):
+    """
+    Оплаченный заказ, уже учтённый в DishPairCount, и его блюда. По ним пары
+    вычитаются, если заказ перестал быть оплаченным или удалён (order = NULL).
+    """
+    order = models.OneToOneField('orders.Order', on_delete=models.SET_NULL, null=True, related_name='+')
+    dish_ids = models.JSONField(default=list)
+
+
+class DishNeighbor(models.Model):
+    """Top-K блюд, которые чаще всего заказывают вместе с dish (build_related_dishes)."""
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('dish', 'rank')
+        ordering = ['dish', 'rank']
+
+
+class DishDailySales(models.Model):
+    """Продано порций блюда за день: из этих корзин собираются окна популярности."""
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('dish', 'day')
+        indexes = [models.Index(fields=['day'])]
+
+
+class DishPopularity(models.Model):
+    """Место блюда по продажам за скользящее окно (refresh_popularity)."""
+    WINDOW_CHOICES = (
+        (7, '7 дней'),
+        (30, '30 дней'),
+    )
+
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='popularity')
+    window = models.PositiveSmallIntegerField(choices=WINDOW_CHOICES)
+    quantity = models.PositiveIntegerField()
+    rank = models.PositiveIntegerField()
+    category_rank = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('dish', 'window')
+        indexes = [models.Index(fields=['window', 'rank'])]
+        ordering = ['window', 'rank']
+
+
+class ImageTaskManager(models.Manager):
+    def enqueue(self, source, object_id, image_name):
+        """Поставить фото в очередь; повторная загрузка перезапускает задачу того же фото."""
+        self.update_or_create(
+            source=source, object_id=object_id,
+            defaults={
+                'image_name': image_name, 'status': 'pending', 'attempts': 0, 'error': '',
+                'next_attempt_at': timezone.now(),
+            },
+        )
+
+    def status_for(self, source, object_id_ref='pk'):
+        """Подзапрос со статусом задачи для annotate() в списках админки."""
+        return models.Subquery(
+            self.filter(source=source, object_id=models.OuterRef(object_id_ref)).values('status')[:1]
+        )
+
+
+class ImageTask(models.Model):
+    """Фото, для которого воркер process_image_tasks делает копии и метаданные."""
+    SOURCE_CHOICES = (
+        ('dish', 'Основное фото блюда'),
+        ('gallery', 'Фото галереи'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'В очереди'),
+        ('processing', 'Обрабатывается'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    )
+
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    image_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    # Раньше этого времени задачу не берут: повторы после ошибки идут с паузой
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ImageTaskManager()
+
+    class Meta:
+        unique_together = ('source', 'object_id')
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f'{self.image_name}: {self.status}'
@@ -0,0 +1,78 @@
+"""
+Полнотекстовый поиск и подсказки по блюдам.
+
+В PostgreSQL поиск идёт по хранимой колонке main_dish.search_vector
+(to_tsvector('russian', name || description), GIN-индекс, см. миграцию
+0003_dish_search_vector) и ранжируется ts_rank. Подсказки при вводе ищутся
+по триграммному GIN-индексу на названии (pg_trgm, миграция
+0004_dish_name_trigram) и терпимы к опечаткам. На других СУБД поиск
+остаётся подстрочным, а подсказки — префиксными по снимку меню.
+"""
+import hashlib
+
+from django.core.cache import caches
+from django.db import connection
+
+from .menu import get_menu
+
+
+SUGGEST_LIMIT = 8
+SUGGEST_CACHE_TIMEOUT = 60
+# Короче триграммы сравнивать нечего: такие запросы отвечает префиксный индекс
+SUGGEST_MIN_TRIGRAM_LENGTH = 3
+
+
+SEARCH_SQL = """
+SELECT id
+FROM main_dish, websearch_to_tsquery('russian', %s) AS query
+WHERE search_vector @@ query
+ORDER BY ts_rank(search_vector, query) DESC, created_at DESC, id DESC
+"""
+
+
+def search_dish_ids(query):
+    """
+    Id блюд по запросу в порядке релевантности.
+
+    Возвращает None, если полнотекстовый поиск недоступен и фильтровать
+    нужно по названию (MenuSnapshot.iter_dishes с query).
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_SQL, [query])
+        return [row[0] for row in cursor.fetchall()]
+
+
+SUGGEST_SQL = """
+SELECT id
+FROM main_dish
+WHERE %s <%% name
+ORDER BY word_similarity(%s, name) DESC, name
+LIMIT %s
+"""
+
+
+def _suggest_ids(prefix, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(SUGGEST_SQL, [prefix, prefix, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def suggest_dishes(prefix, limit=SUGGEST_LIMIT):
+    """Подсказки для строки поиска: до limit блюд из снимка меню."""
+    prefix = ' '.join(prefix.split())
+    if not prefix:
+        return []
+    menu = get_menu()
+    if connection.vendor != 'postgresql' or len(prefix) < SUGGEST_MIN_TRIGRAM_LENGTH:
+        return menu.suggest(prefix, limit)
+
+    # Версия меню в ключе: после правки меню старые подсказки не читаются
+    digest = hashlib.md5(prefix.casefold().encode()).hexdigest()
+    key = f'menu:suggest:{menu.version}:{limit}:{digest}'
+    dish_ids = caches['fragments'].get(key)
+    if dish_ids is None:
+        dish_ids = _suggest_ids(prefix, limit)
+        caches['fragments'].set(key, dish_ids, SUGGEST_CACHE_TIMEOUT)
+    return [menu.dishes_by_id[pk] for pk in dish_ids if pk in menu.dishes_by_id]
@@ -0,0 +1,120 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .fragments import bump_tags
+from .menu import bump_menu_version
+from .models import Allergen, Category, Dish, DishImage
+from .sales import rebuild_sales_days
+from .tasks import enqueue_image, forget_image
+
+
+@receiver(m2m_changed, sender=Dish.allergens.through)
+def refresh_dish_allergen_masks(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # После clear() со стороны аллергена уже не узнать, какие блюда были связаны
+        instance._cleared_dish_ids = list(instance.dishes.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        Dish.objects.filter(pk=instance.pk).refresh_allergen_masks()
+    elif action == 'post_clear':
+        Dish.objects.filter(pk__in=getattr(instance, '_cleared_dish_ids', [])).refresh_allergen_masks()
+    else:
+        Dish.objects.filter(pk__in=pk_set).refresh_allergen_masks()
+
+
+@receiver(pre_delete, sender=Allergen)
+def remember_allergen_dishes(sender, instance, **kwargs):
+    instance._dish_ids = list(instance.dishes.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Allergen)
+def refresh_masks_after_allergen_delete(sender, instance, **kwargs):
+    Dish.objects.filter(pk__in=getattr(instance, '_dish_ids', [])).refresh_allergen_masks()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Dish)
+@receiver(post_delete, sender=Dish)
+@receiver(post_save, sender=Allergen)
+@receiver(post_delete, sender=Allergen)
+@receiver(post_save, sender=DishImage)
+@receiver(post_delete, sender=DishImage)
+@receiver(m2m_changed, sender=Dish.allergens.through)
+def invalidate_menu(sender, **kwargs):
+    if kwargs.get('action', '').startswith('pre_'):
+        return
+    bump_menu_version()
+    # Повторно после коммита: воркер мог пересобрать снимок до фиксации транзакции
+    transaction.on_commit(bump_menu_version)
+
+
+def bump_fragment_tags(*tags):
+    bump_tags(*tags)
+    transaction.on_commit(lambda: bump_tags(*tags))
+
+
+@receiver(pre_save, sender=Dish)
+def remember_dish_category(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_category_id = (
+            Dish.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Dish)
+@receiver(post_delete, sender=Dish)
+def invalidate_dish_fragments(sender, instance, **kwargs):
+    tags = {'catalog', f'category:{instance.category_id}'}
+    previous = getattr(instance, '_previous_category_id', None)
+    if previous is not None:
+        tags.add(f'category:{previous}')
+    bump_fragment_tags(*sorted(tags))
+
+
+@receiver(m2m_changed, sender=Dish.allergens.through)
+def invalidate_allergen_link_fragments(sender, instance, action, reverse, **kwargs):
+    if action.startswith('pre_'):
+        return
+    if reverse:
+        bump_fragment_tags('menu')
+    else:
+        bump_fragment_tags('catalog', f'category:{instance.category_id}')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Allergen)
+@receiver(post_delete, sender=Allergen)
+def invalidate_menu_fragments(sender, **kwargs):
+    bump_fragment_tags('menu')
+
+
+@receiver(post_save, sender=Dish)
+def enqueue_dish_image(sender, instance, raw=False, **kwargs):
+    if not raw:
+        enqueue_image(instance)
+
+
+@receiver(post_save, sender=DishImage)
+def enqueue_gallery_image(sender, instance, raw=False, **kwargs):
+    if not raw:
+        enqueue_image(instance)
+
+
+@receiver(post_delete, sender=Dish)
+@receiver(post_delete, sender=DishImage)
+def forget_image_task(sender, instance, **kwargs):
+    forget_image(instance)
+
+
+@receiver(post_delete, sender='orders.Order')
+def rebuild_deleted_order_sales(sender, instance, **kwargs):
+    # Удалённый заказ не меняет updated_at, и refresh_popularity его не увидит:
+    # корзину его дня пересобираем сразу
+    if instance.status in instance.PAID_STATUSES:
+        rebuild_sales_days([timezone.localdate(instance.created_at)])
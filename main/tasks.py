@@ -0,0 +1,127 @@
+"""
+Фоновая обработка загруженных фото блюд.
+
+Админка только сохраняет оригинал в хранилище, а post_save ставит фото
+в очередь ImageTask. Копии и метаданные (main.images) делает воркер
+process_image_tasks, забирая задачи через SELECT ... FOR UPDATE SKIP LOCKED,
+поэтому воркеров можно запускать несколько.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .fragments import bump_tags
+from .images import BrokenImageError, refresh_variants, variants_are_current
+from .menu import bump_menu_version
+from .models import Dish, DishImage, ImageTask
+
+
+logger = logging.getLogger(__name__)
+
+# source задачи -> модель, поле с фото и JSON-поле с копиями
+SOURCES = {
+    'dish': (Dish, 'main_image', 'main_image_variants'),
+    'gallery': (DishImage, 'image', 'variants'),
+}
+MAX_ATTEMPTS = 3
+# Пауза перед повтором после ошибки хранилища: 1, 2, 4... минуты
+RETRY_DELAY = timedelta(minutes=1)
+STALE_AFTER = timedelta(minutes=10)
+
+
+def source_for(instance):
+    for source, (model, field_name, variants_field) in SOURCES.items():
+        if isinstance(instance, model):
+            return source, field_name, variants_field
+    raise ValueError(f'Для {type(instance).__name__} нет обработки фото')
+
+
+def enqueue_image(instance):
+    """Поставить фото в очередь, если копии сделаны не из текущего оригинала."""
+    source, field_name, variants_field = source_for(instance)
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        # Фото убрали: копии просто забываем, в хранилище идти не нужно
+        if refresh_variants(instance, field_name, variants_field):
+            bump_menu_version()
+        return
+    if not variants_are_current(field_file, getattr(instance, variants_field)):
+        ImageTask.objects.enqueue(source, instance.pk, field_file.name)
+
+
+def forget_image(instance):
+    source, _, _ = source_for(instance)
+    ImageTask.objects.filter(source=source, object_id=instance.pk).delete()
+
+
+def requeue_stale():
+    """Вернуть в очередь задачи воркеров, которые упали посреди обработки."""
+    return ImageTask.objects.filter(
+        status='processing', updated_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status='pending', next_attempt_at=timezone.now(), updated_at=timezone.now())
+
+
+def claim_tasks(limit):
+    now = timezone.now()
+    with transaction.atomic():
+        tasks = list(
+            ImageTask.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now).order_by('next_attempt_at')[:limit]
+        )
+        for task in tasks:
+            task.status = 'processing'
+            task.attempts += 1
+            task.updated_at = now
+        ImageTask.objects.bulk_update(tasks, ['status', 'attempts', 'updated_at'])
+    return tasks
+
+
+def finish_task(task, status, error='', next_attempt_at=None):
+    # Если за время обработки фото загрузили заново, задача уже снова pending — её не трогаем
+    changes = {'status': status, 'error': error, 'updated_at': timezone.now()}
+    if next_attempt_at is not None:
+        changes['next_attempt_at'] = next_attempt_at
+    ImageTask.objects.filter(pk=task.pk, status='processing', image_name=task.image_name).update(**changes)
+
+
+def retry_later(task, error):
+    if task.attempts >= MAX_ATTEMPTS:
+        finish_task(task, 'failed', error)
+    else:
+        delay = RETRY_DELAY * 2 ** (task.attempts - 1)
+        finish_task(task, 'pending', error, next_attempt_at=timezone.now() + delay)
+
+
+def run_task(task):
+    """
+    Сделать копии и метаданные для фото задачи; возвращает True, если фото изменилось.
+    Ошибки хранилища повторяются с паузой, остальные (битый файл, слишком
+    большая картинка) сразу помечают задачу как failed — воркер не падает.
+    """
+    try:
+        model, field_name, variants_field = SOURCES[task.source]
+        instance = model.objects.filter(pk=task.object_id).only('pk', field_name, variants_field).first()
+        if instance is None or getattr(instance, field_name).name != task.image_name:
+            finish_task(task, 'done')
+            return False
+        changed = refresh_variants(instance, field_name, variants_field)
+    except BrokenImageError as exc:
+        logger.warning('Битое фото %s', task.image_name, exc_info=True)
+        finish_task(task, 'failed', str(exc))
+        return False
+    except OSError as exc:
+        logger.warning('Не удалось обработать %s', task.image_name, exc_info=True)
+        retry_later(task, str(exc))
+        return False
+    except Exception as exc:
+        logger.exception('Фото %s не обработать', task.image_name)
+        finish_task(task, 'failed', f'{type(exc).__name__}: {exc}')
+        return False
+
+    finish_task(task, 'done')
+    if changed:
+        bump_menu_version()
+        bump_tags('menu', 'catalog')
+    return changed
@@ -0,0 +1,61 @@
+from django import template
+
+from main.images import VARIANT_FORMATS
+from main.media import media_url as build_media_url
+
+
+register = template.Library()
+
+
+def variant_urls(variants, key):
+    names = (variants or {}).get(key) or {}
+    return [(int(width), build_media_url(name)) for width, name in sorted(names.items(), key=lambda i: int(i[0]))]
+
+
+@register.filter
+def media_url(file_or_name):
+    return build_media_url(file_or_name)
+
+
+@register.filter
+def srcset(urls):
+    return ', '.join(f'{url} {width}w' for width, url in urls)
+
+
+@register.inclusion_tag('main/includes/responsive_image.html')
+def responsive_image(field_file, variants, alt='', css_class='', sizes='100vw', loading='lazy'):
+    """
+    <picture> с WebP и JPEG копиями (main.images) и оригиналом как запасным
+    вариантом, пока копии не готовы. Размеры и заглушка берутся из сохранённых
+    метаданных, поэтому место под фото зарезервировано ещё до загрузки.
+    """
+    sources = []
+    fallback = []
+    metadata = {}
+    if field_file and (variants or {}).get('source') == field_file.name:
+        metadata = variants
+        for key, _, _ in VARIANT_FORMATS:
+            urls = variant_urls(variants, key)
+            if key == 'jpeg':
+                fallback = urls
+            elif urls:
+                sources.append({'type': f'image/{key}', 'urls': urls})
+
+    if fallback:
+        # Средний размер — разумный src для браузеров без srcset
+        src = fallback[len(fallback) // 2][1]
+    else:
+        src = build_media_url(field_file)
+    return {
+        'src': src,
+        'sources': sources,
+        'fallback': fallback,
+        'alt': alt,
+        'css_class': css_class,
+        'sizes': sizes,
+        'loading': loading,
+        'width': metadata.get('width'),
+        'height': metadata.get('height'),
+        'color': metadata.get('color'),
+        'placeholder': metadata.get('placeholder'),
+    }
@@ -1,3 +1,232 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.core.management import call_command
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from PIL import Image
+from users.models import CustomUser
+
+from .models import Allergen, Category, Dish, DishImage, ImageTask
+
+
+# Тесты не трогают файловый кеш разработчика
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'menu'},
+    'fragments': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'fragments'},
+}
+
+def create_menu(size):
+    category = Category.objects.create(name='Супы', slug='soups')
+    allergens = [
+        Allergen.objects.create(name='Глютен', slug='gluten'),
+        Allergen.objects.create(name='Молоко', slug='milk'),
+    ]
+    for i in range(size):
+        dish = Dish.objects.create(
+            name=f'Блюдо {i}', slug=f'dish-{i}', category=category, price=Decimal(100 + i),
+        )
+        dish.allergens.set(allergens[:i % 3])
+    return category
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DishCardQueriesTests(TestCase):
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return len(queries)
+
+    def test_grid_of_100_dishes_renders_in_fixed_queries(self):
+        create_menu(100)
+
+        with self.assertNumQueries(2):
+            html = render_to_string('main/catalog_page.html', {'dishes': Dish.objects.for_cards()})
+        self.assertEqual(html.count('dish-card'), 100)
+        self.assertIn('Глютен', html)
+
+    def test_card_grids_do_not_depend_on_menu_size(self):
+        def grid_queries(size):
+            Dish.objects.all().delete()
+            Category.objects.all().delete()
+            Allergen.objects.all().delete()
+            create_menu(size)
+            cache.clear()
+            return (
+                self.count_queries(lambda: self.client.get('/catalog/', HTTP_HX_REQUEST='true')),
+                self.count_queries(lambda: self.client.get('/dish/dish-1', HTTP_HX_REQUEST='true')),
+            )
+
+        self.assertEqual(grid_queries(5), grid_queries(100))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DishDetailQueriesTests(TestCase):
+    def setUp(self):
+        create_menu(20)
+        for dish in Dish.objects.all():
+            DishImage.objects.create(dish=dish, image=f'dishes/{dish.slug}.jpg')
+        cache.clear()
+
+    def get_detail_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/dish/dish-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'dishes/dish-1.jpg')
+        self.assertEqual(len(response.context['related_dishes']), 4)
+        # Точки сохранения ATOMIC_REQUESTS к бюджету страницы не относятся
+        return [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+
+    def test_detail_page_query_budget(self):
+        # Категории, блюда, аллергены, галереи, соседи и рейтинг — один раз при сборке снимка меню
+        self.assertEqual(len(self.get_detail_queries()), 6)
+        self.assertEqual(self.get_detail_queries(), [])
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_URL='https://media.example.com/bucket/')
+class MediaUrlTests(TestCase):
+    def test_grid_of_100_dishes_makes_no_storage_calls(self):
+        create_menu(100)
+        for dish in Dish.objects.all():
+            name = f'dishes/{dish.slug}.jpg'
+            variants = {
+                'source': name,
+                'webp': {'160': f'dishes/variants/{dish.slug}_160.webp'},
+                'jpeg': {'160': f'dishes/variants/{dish.slug}_160.jpg'},
+            }
+            Dish.objects.filter(pk=dish.pk).update(main_image=name, main_image_variants=variants)
+        dishes = list(Dish.objects.for_cards())
+
+        storage_class = type(storages['default'])
+        with mock.patch.object(storage_class, 'url') as url, \
+                mock.patch.object(storage_class, 'exists') as exists, \
+                mock.patch.object(storage_class, 'open') as open_file:
+            html = render_to_string('main/catalog_page.html', {'dishes': dishes})
+
+        self.assertEqual(html.count('<picture'), 100)
+        self.assertIn('https://media.example.com/bucket/dishes/variants/dish-7_160.webp 160w', html)
+        url.assert_not_called()
+        exists.assert_not_called()
+        open_file.assert_not_called()
+
+
+def png(name, width=300, height=200):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ImageTaskTests(TestCase):
+    def setUp(self):
+        # Вместо MinIO — локальное хранилище во временной папке
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        overrides = override_settings(
+            MEDIA_URL='/media/',
+            STORAGES={
+                **settings.STORAGES,
+                'default': {
+                    'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                    'OPTIONS': {'location': location, 'base_url': '/media/'},
+                },
+            },
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.storage = storages['default']
+        self.category = Category.objects.create(name='Супы', slug='soups')
+
+    def create_dish(self):
+        dish = Dish(name='Борщ', slug='borsch', category=self.category, price=Decimal(300))
+        dish.main_image.save('borsch.png', png('borsch.png'), save=False)
+        dish.save()
+        return dish
+
+    def test_upload_is_queued_instead_of_processed(self):
+        dish = self.create_dish()
+
+        dish.refresh_from_db()
+        self.assertTrue(self.storage.exists(dish.main_image.name))
+        self.assertEqual(dish.main_image_variants, {})
+        task = ImageTask.objects.get(source='dish', object_id=dish.pk)
+        self.assertEqual((task.status, task.image_name), ('pending', dish.main_image.name))
+
+    def test_worker_builds_variants_and_metadata(self):
+        dish = self.create_dish()
+        image = DishImage(dish=dish)
+        image.image.save('side.png', png('side.png', 600, 600), save=False)
+        image.save()
+
+        call_command('process_image_tasks', '--once', stdout=StringIO())
+
+        dish.refresh_from_db()
+        image.refresh_from_db()
+        variants = dish.main_image_variants
+        self.assertEqual(variants['source'], dish.main_image.name)
+        self.assertEqual((variants['width'], variants['height']), (300, 200))
+        self.assertTrue(self.storage.exists(variants['webp']['160']))
+        self.assertEqual(image.variants['width'], 600)
+        self.assertEqual(set(ImageTask.objects.values_list('status', flat=True)), {'done'})
+
+    def test_storage_errors_are_retried_with_backoff(self):
+        dish = self.create_dish()
+        self.storage.delete(dish.main_image.name)
+
+        with self.assertLogs('main.tasks', 'WARNING'):
+            call_command('process_image_tasks', '--once', stdout=StringIO())
+        task = ImageTask.objects.get(object_id=dish.pk)
+        self.assertEqual((task.status, task.attempts), ('pending', 1))
+        self.assertGreater(task.next_attempt_at, timezone.now())
+
+        for _ in range(2):
+            ImageTask.objects.update(next_attempt_at=timezone.now())
+            with self.assertLogs('main.tasks', 'WARNING'):
+                call_command('process_image_tasks', '--once', stdout=StringIO())
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('failed', 3))
+        self.assertTrue(task.error)
+
+    def test_non_image_upload_fails_without_retries(self):
+        dish = Dish(name='Борщ', slug='borsch', category=self.category, price=Decimal(300))
+        dish.main_image.save('borsch.png', ContentFile(b'not an image', 'borsch.png'), save=False)
+        dish.save()
+
+        with self.assertLogs('main.tasks', 'WARNING'):
+            call_command('process_image_tasks', '--once', stdout=StringIO())
+
+        task = ImageTask.objects.get(object_id=dish.pk)
+        self.assertEqual((task.status, task.attempts), ('failed', 1))
+        self.assertIn('UnidentifiedImageError', task.error)
+
+    def test_broken_image_fails_without_retries(self):
+        dish = self.create_dish()
+
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100), self.assertLogs('main.tasks', 'WARNING'):
+            call_command('process_image_tasks', '--once', stdout=StringIO())
+
+        task = ImageTask.objects.get(object_id=dish.pk)
+        self.assertEqual((task.status, task.attempts), ('failed', 1))
+        self.assertIn('DecompressionBombError', task.error)
+
+    def test_admin_shows_processing_state(self):
+        admin = CustomUser.objects.create(
+            phone='+79990000000', first_name='Админ', last_name='Тестов', is_staff=True, is_superuser=True,
+        )
+        self.client.force_login(admin)
+        self.create_dish()
+
+        self.assertContains(self.client.get('/admin/main/dish/'), 'Обрабатывается')
+        call_command('process_image_tasks', '--once', stdout=StringIO())
+        self.assertContains(self.client.get('/admin/main/dish/'), 'Готово')
@@ -7,5 +7,6 @@ urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
     path('catalog/', views.CatalogView.as_view(), name = 'catalog_all'),
     path('catalog/<slug:category_slug>', views.CatalogView.as_view(), name='catalog'),
+    path('search/suggest/', views.SearchSuggestView.as_view(), name='search_suggest'),
     path('dish/<slug:slug>', views.DishDetailView.as_view(), name='dish_detail'),
 ]
@@ -1,95 +1,193 @@
-from django.shortcuts import get_object_or_404
+import hashlib
+
 from django.views.generic import TemplateView, DetailView
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
 from django.template.response import TemplateResponse
-from .models import Category, Dish
-from django.db.models import Q
+from django.utils.decorators import method_decorator
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+from cart.middleware import get_cart
+from .fragments import is_cacheable, render_fragment
+from .menu import decode_cursor, encode_cursor, get_menu, parse_price
+from .models import Dish
+from .search import search_dish_ids, suggest_dishes
+
+
+def menu_etag(request, *args, **kwargs):
+    """
+    Версия страницы меню: снимок меню, пользователь с его аллергенами и вид
+    ответа. Полная страница ещё зависит от счётчика корзины в шапке.
+    """
+    parts = [get_menu().version, request.user.pk or '']
+    if request.user.is_authenticated:
+        parts.append(request.user.excluded_allergen_mask)
+    if request.headers.get('HX-Request'):
+        parts.append('hx')
+    else:
+        parts.append(get_cart(request).total_items)
+    digest = hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def menu_last_modified(request, *args, **kwargs):
+    return get_menu().last_modified
+
+
+# 304 без рендера шаблонов, если меню и пользователь не менялись
+menu_conditional = method_decorator(
+    [vary_on_headers('HX-Request'), condition(etag_func=menu_etag, last_modified_func=menu_last_modified)],
+    name='dispatch',
+)
 
 
+@menu_conditional
 class IndexView(TemplateView):
     template_name = 'main/base.html'
 
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        menu = get_menu()
+        excluded_mask = 0
+        if self.request.user.is_authenticated:
+            excluded_mask = self.request.user.excluded_allergen_mask
+        context['categories'] = menu.categories
+        context['popular_dishes'] = menu.popular(excluded_mask=excluded_mask)
         context['current_category'] = None
         return context
     
     def get(self, request, *args, **kwargs):
+        if is_cacheable(request):
+            return render_fragment(
+                request, 'main/home_content.html', lambda: self.get_context_data(**kwargs),
+                {}, ['menu', 'catalog'],
+            )
         context = self.get_context_data(**kwargs)
         if request.headers.get('HX-Request'):
             return TemplateResponse(request, 'main/home_content.html', context)
         return TemplateResponse(request, self.template_name, context)
     
+@menu_conditional
 class CatalogView(TemplateView):
     template_name = 'main/base.html'
 
-    FILTER_MAPPING = {
-        'min_price' : lambda queryset, value: queryset.filter(price__gte=value),
-        'max_price' : lambda queryset, value: queryset.filter(price__lte=value),
-    }
+    PAGE_SIZE = 24
+    CACHED_FRAGMENTS = ('main/catalog.html', 'main/filter_modal.html')
+
+    def get_filter_params(self):
+        """Параметры фильтров в нормализованном виде: для формы, ссылок и ключа кеша."""
+        params = self.request.GET
+        return {
+            'min_price': (params.get('min_price') or '').strip(),
+            'max_price': (params.get('max_price') or '').strip(),
+            'q': ' '.join(params.get('q', '').split()),
+            'show_all': '1' if params.get('show_all') in ('1', 'true', 'on') else '',
+        }
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(**kwargs)
+        menu = get_menu()
         category_slug = kwargs.get('category_slug')
-        categories = Category.objects.all()
-        dishes = Dish.objects.all().order_by('-created_at')
-        show_all_dishes = self.request.GET.get('show_all') in ('1', 'true', 'on')
+        filter_params = self.get_filter_params()
+        show_all_dishes = bool(filter_params['show_all'])
+        excluded_mask = 0
         if self.request.user.is_authenticated and not show_all_dishes:
-            excluded_ids = list(self.request.user.excluded_allergens.values_list('pk', flat=True))
-            if excluded_ids:
-                dishes = dishes.exclude(allergens__id__in=excluded_ids).distinct()
+            excluded_mask = self.request.user.excluded_allergen_mask
         current_category = None
 
         if category_slug:
-            current_category = get_object_or_404(Category, slug=category_slug)
-            dishes = dishes.filter(category=current_category)
-        query = self.request.GET.get('q')
-        if query:
-            dishes = dishes.filter(
-                Q(name__icontains=query)
+            current_category = menu.categories_by_slug.get(category_slug)
+            if current_category is None:
+                raise Http404('Категория не найдена')
+        query = filter_params['q']
+
+        filters = {
+            'category': current_category,
+            'min_price': parse_price(filter_params['min_price']),
+            'max_price': parse_price(filter_params['max_price']),
+            'query': query,
+            'excluded_mask': excluded_mask,
+            'dish_ids': search_dish_ids(query) if query else None,
+        }
+        dishes, next_key = menu.page(
+            self.PAGE_SIZE, after=decode_cursor(self.request.GET.get('cursor')), **filters
+        )
+
+        next_page_query = None
+        if next_key is not None:
+            next_page_query = urlencode(
+                {**{k: v for k, v in filter_params.items() if v}, 'cursor': encode_cursor(next_key)}
             )
-        
-        filter_params = {}
-        for param, filter_func in self.FILTER_MAPPING.items():
-            value = self.request.GET.get(param)
-            if value:
-                dishes = filter_func(dishes, value)
-                filter_params[param] = value
-            else:
-                filter_params[param] = ''
-            
-        filter_params['q'] = query or ''
-        filter_params['show_all'] = '1' if show_all_dishes else ''
 
         context.update({
-            'categories': categories,
+            'categories': menu.categories,
             'dishes': dishes,
+            'next_page_query': next_page_query,
             'current_category': current_category,
             'filter_params': filter_params,
-            'search_query': query or '',
+            'search_query': query,
 
         })
 
+        if self.request.GET.get('show_filters') == 'true':
+            context['facets'] = menu.facets(**filters)
+
         if self.request.GET.get('show_search') == 'true':
             context['show_search'] = True
         elif self.request.GET.get('reset_search') == 'true':
             context['reset_search'] = True
         return context
     
+    def get_fragment_template(self):
+        params = self.request.GET
+        if params.get('show_search') == 'true':
+            return 'main/search_input.html'
+        if params.get('reset_search') == 'true':
+            return 'main/search_button.html'
+        if params.get('cursor'):
+            return 'main/catalog_page.html'
+        if params.get('show_filters') == 'true':
+            return 'main/filter_modal.html'
+        return 'main/catalog.html'
+
+    def get_fragment_tags(self, template, category_slug):
+        """Теги записи кеша; None — фрагмент не кешируется."""
+        if template == 'main/filter_modal.html' or not category_slug:
+            # Счётчики фильтров охватывают все категории
+            return ['menu', 'catalog']
+        category = get_menu().categories_by_slug.get(category_slug)
+        if category is None:
+            return None
+        return ['menu', f'category:{category.pk}']
+
     def get(self, request, *args, **kwargs):
-        context = self.get_context_data(**kwargs)
-        if request.headers.get('HX-Request'):
-            if context.get('show_search'):
-                return TemplateResponse(request, 'main/search_input.html', context)
-            elif context.get('reset_search'):
-                return TemplateResponse(request, 'main/search_button.html', {})
-            template = 'main/filter_modal.html' if request.GET.get('show_filters') == 'true' else 'main/catalog.html'
-            return TemplateResponse(request, template, context)
-        return TemplateResponse(request, self.template_name, context)
+        if not request.headers.get('HX-Request'):
+            return TemplateResponse(request, self.template_name, self.get_context_data(**kwargs))
+
+        template = self.get_fragment_template()
+        if template == 'main/search_button.html':
+            return TemplateResponse(request, template, {})
+        if template in self.CACHED_FRAGMENTS and is_cacheable(request):
+            tags = self.get_fragment_tags(template, kwargs.get('category_slug'))
+            if tags is not None:
+                return render_fragment(
+                    request, template, lambda: self.get_context_data(**kwargs),
+                    self.get_filter_params(), tags,
+                )
+        return TemplateResponse(request, template, self.get_context_data(**kwargs))
     
 
+class SearchSuggestView(TemplateView):
+    template_name = 'main/search_suggestions.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['suggestions'] = suggest_dishes(self.request.GET.get('q', ''))
+        return context
+
+
+@menu_conditional
 class DishDetailView(DetailView):
     model = Dish
     template_name = 'main/dish_detail.html'
@@ -97,16 +195,21 @@ class DishDetailView(DetailView):
     slug_url_kwarg = 'slug'
 
 
+    def get_object(self, queryset=None):
+        dish = get_menu().dishes_by_slug.get(self.kwargs.get(self.slug_url_kwarg))
+        if dish is None:
+            raise Http404('Блюдо не найдено')
+        return dish
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        dish = self.get_object()
-        related = Dish.objects.filter(category=dish.category).exclude(id=dish.id)
+        menu = get_menu()
+        dish = self.object
+        excluded_mask = 0
         if self.request.user.is_authenticated:
-            excluded_ids = list(self.request.user.excluded_allergens.values_list('pk', flat=True))
-            if excluded_ids:
-                related = related.exclude(allergens__id__in=excluded_ids).distinct()
-        context['categories'] = Category.objects.all()
-        context['related_dishes'] = related[:4]
+            excluded_mask = self.request.user.excluded_allergen_mask
+        context['categories'] = menu.categories
+        context['related_dishes'] = menu.related(dish, excluded_mask)
         context['current_category'] = dish.category.slug
         return context
 
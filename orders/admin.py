@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.utils.safestring import mark_safe
+from main.media import media_url
 from .models import Order, OrderItem
 
 
@@ -14,7 +15,7 @@ class OrderItemInline(admin.TabularInline):
 
     def image_preview(self, obj):
         if obj.dish.main_image:
-            return mark_safe(f'<img src="{obj.dish.main_image.url}" style="max-height: 100px; "max-width: 100px; object-fit: cover;" />')
+            return mark_safe(f'<img src="{media_url(obj.dish.main_image)}" style="max-height: 100px; "max-width: 100px; object-fit: cover;" />')
         return mark_safe('<span style="color: gray;"> No Image</span>')
     image_preview.short_description = 'Image'
 
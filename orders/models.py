@@ -11,6 +11,8 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     )
+    # Оплаченные заказы: их уже не удаляют при ошибке оплаты, по ним считаются рекомендации
+    PAID_STATUSES = ('processing', 'shipped', 'delivered')
     #PAYMENT_PROVIDER_CHOICES = (
     #    ('stripe', 'Stripe'),
     #)
@@ -34,6 +36,10 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Курсор build_related_dishes по изменённым заказам
+        indexes = [models.Index(fields=['updated_at', 'id'])]
+
 
     def __str__(self):
         return f"Заказ {self.id} от {self.phone}"
@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.utils.decorators import method_decorator
 from django.http import HttpResponse
 from django.template.response import TemplateResponse
@@ -17,6 +18,9 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+# Без транзакции на весь запрос: блокировки корзины держатся только пока
+# создаётся заказ, а не во время запроса к платёжному провайдеру
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
 @method_decorator(login_required(login_url='/users/login'), name='dispatch')
 class CheckoutView(CartMixin, View):
     def get(self, request):
@@ -36,7 +40,7 @@ class CheckoutView(CartMixin, View):
         context = {
             'form': form,
             'cart': cart,
-            'cart_items': cart.items.select_related('dish').order_by('-added_at'),
+            'cart_items': cart.get_items(),
             'total_price': total_price,
         }
 
@@ -60,7 +64,7 @@ class CheckoutView(CartMixin, View):
             context = {
                 'form': OrderForm(user=request.user),
                 'cart': cart,
-                'cart_items': cart.items.select_related('dish').order_by('-added_at'),
+                'cart_items': cart.get_items(),
                 'total_price': cart.subtotal,
                 'error_message': 'Please select a valid payment provider (Stripe or Heleket).',
             }
@@ -75,39 +79,53 @@ class CheckoutView(CartMixin, View):
         form = OrderForm(form_data, user=request.user)
 
         if form.is_valid():
-            order = Order.objects.create(
-                user=request.user,
-                first_name=form.cleaned_data['first_name'],
-                last_name=form.cleaned_data['last_name'],
-                email=form.cleaned_data['email'],
-                company=form.cleaned_data['company'],
-                address1=form.cleaned_data['address1'],
-                address2=form.cleaned_data['address2'],
-                city=form.cleaned_data['city'],
-                country=form.cleaned_data['country'],
-                province=form.cleaned_data['province'],
-                postal_code=form.cleaned_data['postal_code'],
-                phone=form.cleaned_data['phone'],
-                special_instructions='',
-                total_price=total_price,
-                payment_provider=payment_provider,
-            )
-
-            for item in cart.items.select_related('dish'):
-                logger.debug(f"Processing cart item: dish={item.dish.name}, quantity={item.quantity}")
-                OrderItem.objects.create(
-                    order=order,
-                    dish=item.dish,
-                    quantity=item.quantity,
-                    price=item.dish.price or Decimal('0.00')
+            with transaction.atomic():
+                # Позиции читаются один раз под блокировкой: сумма заказа и его строки
+                # берутся из одного снимка, параллельная правка корзины ждёт до коммита.
+                # Провайдер вызывается уже после коммита, без блокировок
+                items = cart.lock_for_checkout()
+                if not items:
+                    logger.warning("Cart was emptied during checkout, redirecting to cart page")
+                    if request.headers.get('HX-Request'):
+                        return TemplateResponse(request, 'orders/empty_cart.html', {'message': 'Your cart is empty'})
+                    return redirect('cart:cart_modal')
+
+                lines = [(item.dish, item.quantity, item.dish.price or Decimal('0.00')) for item in items]
+                total_price = sum((price * quantity for _, quantity, price in lines), Decimal('0.00'))
+
+                order = Order.objects.create(
+                    user=request.user,
+                    first_name=form.cleaned_data['first_name'],
+                    last_name=form.cleaned_data['last_name'],
+                    email=form.cleaned_data['email'],
+                    company=form.cleaned_data['company'],
+                    address1=form.cleaned_data['address1'],
+                    address2=form.cleaned_data['address2'],
+                    city=form.cleaned_data['city'],
+                    country=form.cleaned_data['country'],
+                    province=form.cleaned_data['province'],
+                    postal_code=form.cleaned_data['postal_code'],
+                    phone=form.cleaned_data['phone'],
+                    special_instructions='',
+                    total_price=total_price,
+                    payment_provider=payment_provider,
                 )
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, dish=dish, quantity=quantity, price=price)
+                    for dish, quantity, price in lines
+                ])
+                logger.debug(f"Order {order.id}: {len(lines)} items, total={total_price}")
+
+            # После оплаты из корзины вычитаются оформленные количества:
+            # добавленное после снимка остаётся в корзине
+            ordered_items = {item.id: item.quantity for item in items}
 
             try:
                 logger.info(f"Creating payment session for provider: {payment_provider}")
                 if payment_provider == 'stripe':
                     logger.debug("Creating Stripe checkout session")
                     checkout_session = create_stripe_checkout_session(order, request)
-                    cart.clear()
+                    cart.remove_ordered(ordered_items)
                     if request.headers.get('HX-Request'):
                         response = HttpResponse(status=200)
                         response['HX-Redirect'] = checkout_session.url
@@ -116,7 +134,7 @@ class CheckoutView(CartMixin, View):
                     return redirect(checkout_session.url)
                 elif payment_provider == 'heleket':
                     payment = create_heleket_payment(order, request)
-                    cart.clear()
+                    cart.remove_ordered(ordered_items)
                     if request.headers.get('HX-Request'):
                         response = HttpResponse(status=200)
                         response['HX-Redirect'] = payment['url']
@@ -128,7 +146,7 @@ class CheckoutView(CartMixin, View):
                 context = {
                     'form': form,
                     'cart': cart,
-                    'cart_items': cart.items.select_related('dish').order_by('-added_at'),
+                    'cart_items': cart.get_items(),
                     'total_price': total_price,
                     'error_message': f'Payment processing error: {str(e)}',
                 }
@@ -140,7 +158,7 @@ class CheckoutView(CartMixin, View):
             context = {
                 'form': form,
                 'cart': cart,
-                'cart_items': cart.items.select_related('dish').order_by('-added_at'),
+                'cart_items': cart.get_items(),
                 'total_price': total_price,
                 'error_message': 'Please correct the errors in the form.',
             }
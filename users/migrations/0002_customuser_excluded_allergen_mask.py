@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:02
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_excluded_allergen_masks(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    masks = defaultdict(int)
+    links = CustomUser.excluded_allergens.through.objects.exclude(allergen__bit=None)
+    for user_id, bit in links.values_list('customuser_id', 'allergen__bit'):
+        masks[user_id] |= 1 << bit
+    users = list(CustomUser.objects.filter(pk__in=masks).only('pk'))
+    for user in users:
+        user.excluded_allergen_mask = masks[user.pk]
+    CustomUser.objects.bulk_update(users, ['excluded_allergen_mask'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_allergen_bit_dish_allergen_mask'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='excluded_allergen_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_excluded_allergen_masks, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils.html import strip_tags
 from phonenumber_field.modelfields import PhoneNumberField
+from main.models import allergen_mask
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, phone, first_name, last_name, password=None, **extra_fields):
@@ -41,6 +42,7 @@ class CustomUser(AbstractUser):
         blank=True,
         verbose_name='исключить аллергены'
     )
+    excluded_allergen_mask = models.BigIntegerField(default=0, editable=False)
 
     username = CustomUserManager()
 
@@ -52,6 +54,15 @@ class CustomUser(AbstractUser):
         return self.phone
     
 
+    def refresh_excluded_allergen_mask(self):
+        self.excluded_allergen_mask = allergen_mask(
+            self.excluded_allergens.values_list('bit', flat=True)
+        )
+        type(self).objects.filter(pk=self.pk).update(
+            excluded_allergen_mask=self.excluded_allergen_mask
+        )
+    
+
     def clean(self):
         for field in ['address1', 'address2', 'city',
                       'country','postal_code', 'phone']:
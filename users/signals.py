@@ -0,0 +1,47 @@
+from collections import defaultdict
+
+from django.db.models.signals import m2m_changed, post_delete, pre_delete
+from django.dispatch import receiver
+
+from main.models import Allergen, allergen_mask
+from .models import CustomUser
+
+
+def refresh_masks(user_ids):
+    """Пересчитать excluded_allergen_mask пачкой пользователей."""
+    links = CustomUser.excluded_allergens.through.objects.filter(
+        customuser_id__in=user_ids,
+    ).values_list('customuser_id', 'allergen__bit')
+    bits = defaultdict(list)
+    for user_id, bit in links:
+        bits[user_id].append(bit)
+
+    users = list(CustomUser.objects.filter(pk__in=user_ids).only('pk', 'excluded_allergen_mask'))
+    for user in users:
+        user.excluded_allergen_mask = allergen_mask(bits[user.pk])
+    CustomUser.objects.bulk_update(users, ['excluded_allergen_mask'], batch_size=500)
+
+
+@receiver(m2m_changed, sender=CustomUser.excluded_allergens.through)
+def refresh_user_allergen_masks(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_user_ids = list(instance.users_excluding.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.refresh_excluded_allergen_mask()
+    elif action == 'post_clear':
+        refresh_masks(getattr(instance, '_cleared_user_ids', []))
+    else:
+        refresh_masks(pk_set)
+
+
+@receiver(pre_delete, sender=Allergen)
+def remember_excluding_users(sender, instance, **kwargs):
+    instance._user_ids = list(instance.users_excluding.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Allergen)
+def refresh_masks_after_allergen_delete(sender, instance, **kwargs):
+    refresh_masks(getattr(instance, '_user_ids', []))
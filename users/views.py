@@ -8,7 +8,8 @@ from .forms import CustomUserCreationForm, CustomUserLoginForm, \
     CustomUserUpdateForm
 from .models import CustomUser
 from django.contrib import messages
-from main.models import Dish, Allergen
+from main.menu import get_menu
+from main.models import Allergen
 from orders.models import Order
 
 
@@ -48,12 +49,9 @@ def profile_view(request):
     else:
         form = CustomUserUpdateForm(instance=request.user)
 
-    recommended_dishes = Dish.objects.all().order_by('id')
-    if request.user.is_authenticated:
-        excluded_ids = list(request.user.excluded_allergens.values_list('pk', flat=True))
-        if excluded_ids:
-            recommended_dishes = recommended_dishes.exclude(allergens__id__in=excluded_ids).distinct()
-    recommended_dishes = recommended_dishes[:3]
+    recommended_dishes = get_menu().popular(
+        window=30, excluded_mask=request.user.excluded_allergen_mask, limit=3,
+    )
 
     return TemplateResponse(request, 'users/profile.html', {
         'form': form,